@@ -0,0 +1,98 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver
+
+# Маршруты, которые под ASGI обслуживаются асинхронными представлениями.
+# Выгрузка списка покупок здесь потому, что потоковый ответ Django 3.2
+# под ASGI читает в цикле событий, где запросы к базе запрещены
+ASYNC_ROUTES = {
+    'recipes-list',
+    'recipes-detail',
+    'recipes-favorite',
+    'recipes-shopping-cart',
+    'recipes-download-shopping-cart',
+    'ingredients-list',
+    'tags-list',
+    'tags-detail',
+    'users-subscriptions',
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_VIEW_THREADS,
+            thread_name_prefix='async-view',
+        )
+    return _executor
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняется в потоке пула. Ответ DRF рендерится здесь же, а не
+    в общем синхронном потоке ASGI; соединение потока с базой после
+    запроса закрывается с учётом CONN_MAX_AGE, как в request_finished.
+
+    Потоковый ответ тоже читается здесь целиком: Django 3.2 перебирает
+    его в цикле событий, где итератор по курсору базы не работает.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.streaming:
+            response.streaming_content = list(response.streaming_content)
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Асинхронная обёртка синхронного представления.
+
+    В Django 3.2 нет асинхронного ORM, а синхронные представления под
+    ASGI выполняются по одному в общем потоке (thread_sensitive=True).
+    Обёртка отдаёт представление в пул из ASYNC_VIEW_THREADS потоков:
+    цикл событий не ждёт базу, а медленный запрос занимает один поток
+    пула, а не весь воркер.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(
+            run_view,
+            thread_sensitive=False,
+            executor=get_executor(),
+        )(view, request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_patterns(patterns):
+    """Копия маршрутов в том же порядке, где представления из
+    ASYNC_ROUTES заменены асинхронными; вложенные include обходятся."""
+    copied = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            pattern = URLResolver(
+                pattern.pattern,
+                async_patterns(pattern.url_patterns),
+                pattern.default_kwargs,
+                pattern.app_name,
+                pattern.namespace,
+            )
+        elif pattern.name in ASYNC_ROUTES:
+            pattern = URLPattern(
+                pattern.pattern,
+                async_view(pattern.callback),
+                pattern.default_args,
+                pattern.name,
+            )
+        copied.append(pattern)
+    return copied
@@ -0,0 +1,171 @@
+import base64
+import binascii
+import uuid
+from functools import cached_property
+from tempfile import SpooledTemporaryFile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework.serializers import (
+    Field,
+    FileField,
+    ListSerializer,
+    ValidationError,
+)
+
+from foodgram.constants import (
+    BASE64_CHUNK_SIZE,
+    MAX_IMAGE_PIXELS,
+    MAX_IMAGE_UPLOAD_SIZE,
+)
+
+# Заголовок data-URI ищется только в начале строки
+DATA_URI_HEADER_LENGTH = 100
+# Как в django.utils.encoding.filepath_to_uri
+URL_SAFE_CHARACTERS = "/~!*()'"
+IMAGE_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+
+def sniff_image_format(header):
+    """Формат изображения по первым байтам файла."""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+class Base64ImageField(FileField):
+    """Изображение в base64 (data-URI или просто строка).
+
+    Строка декодируется кусками во временный файл, который уходит из
+    памяти на диск после FILE_UPLOAD_MAX_MEMORY_SIZE, поэтому целиком
+    в памяти остаётся только сама строка из JSON. Размер файла проверяется
+    по длине строки до декодирования, формат — по первым байтам, размер
+    в пикселях — по заголовку изображения, без декодирования пикселей.
+    """
+
+    default_error_messages = {
+        'invalid': 'Загрузите изображение в base64',
+        'invalid_image': 'Загрузите корректное изображение',
+        'invalid_type': (
+            'Поддерживаются изображения '
+            f'{", ".join(IMAGE_EXTENSIONS.values())}'
+        ),
+        'max_size': (
+            'Размер изображения не больше '
+            f'{MAX_IMAGE_UPLOAD_SIZE // (1024 * 1024)} МБ'
+        ),
+        'max_pixels': (
+            'Изображение не больше '
+            f'{MAX_IMAGE_PIXELS // 1_000_000} мегапикселей'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or not data:
+            self.fail('invalid')
+        start = data.find(';base64,', 0, DATA_URI_HEADER_LENGTH)
+        start = 0 if start == -1 else start + len(';base64,')
+        padding = len(data[-2:]) - len(data[-2:].rstrip('='))
+        size = (len(data) - start) // 4 * 3 - padding
+        if size <= 0:
+            self.fail('invalid')
+        if size > MAX_IMAGE_UPLOAD_SIZE:
+            self.fail('max_size')
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            image_format = self.decode(data, start, file)
+            self.check_image(file, image_format)
+        except BaseException:
+            file.close()
+            raise
+        file.seek(0)
+        return UploadedFile(
+            file,
+            name=f'{uuid.uuid4()}.{IMAGE_EXTENSIONS[image_format]}',
+            content_type=Image.MIME[image_format],
+            size=size,
+        )
+
+    def decode(self, data, start, file):
+        """Пишет декодированную строку в file; возвращает формат,
+        определённый по первому куску."""
+        image_format = None
+        for position in range(start, len(data), BASE64_CHUNK_SIZE):
+            try:
+                chunk = base64.b64decode(
+                    data[position:position + BASE64_CHUNK_SIZE],
+                    validate=True,
+                )
+            except (binascii.Error, ValueError):
+                self.fail('invalid')
+            if image_format is None:
+                image_format = sniff_image_format(chunk)
+                if image_format is None:
+                    self.fail('invalid_type')
+            file.write(chunk)
+        return image_format
+
+    def check_image(self, file, image_format):
+        file.seek(0)
+        try:
+            with Image.open(file, formats=(image_format, )) as image:
+                width, height = image.size
+                if width * height > MAX_IMAGE_PIXELS:
+                    self.fail('max_pixels')
+                image.verify()
+        except ValidationError:
+            raise
+        except Image.DecompressionBombError:
+            self.fail('max_pixels')
+        except Exception:
+            self.fail('invalid_image')
+
+
+class ImageVariantField(Field):
+    """Ссылка на вариант изображения рецепта из Recipe.image_variants.
+
+    Без variant в списке отдаётся карточка, в одном рецепте — полный
+    размер. Пока варианты не готовы, отдаётся исходное изображение.
+    Ссылка собирается из MEDIA_URL, прочитанного при создании поля,
+    и имени файла, как в FileSystemStorage.url, но без обращения
+    к хранилищу; ссылки всегда относительные.
+    """
+
+    def __init__(self, variant=None, image_format='webp', **kwargs):
+        self.variant = variant
+        self.image_format = image_format
+        self.media_url = settings.MEDIA_URL
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    @cached_property
+    def variant_name(self):
+        if self.variant is not None:
+            return self.variant
+        if isinstance(self.parent.parent, ListSerializer):
+            return 'card'
+        return 'full'
+
+    def to_representation(self, recipe):
+        name = recipe.image.name
+        if not name:
+            return None
+        variant = recipe.image_variants.get(self.variant_name)
+        if variant is not None:
+            name = variant.get(self.image_format, name)
+        return self.media_url + quote(name, safe=URL_SAFE_CHARACTERS)
@@ -0,0 +1,164 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from foodgram.constants import PAGE_SIZE
+from recipes.matching import cookable, update_ingredient_ids
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from users.models import User
+
+PREFIX = 'can_cook_bench'
+INDEXES = ('recipe_first_ingredient_idx', 'recipe_ingredient_ids_idx')
+# cooking_time синтетического рецепта — сколько ингредиентов в него
+# выбрать; random() в кубе: ингредиенты из начала списка встречаются
+# чаще, как соль и мука в настоящих рецептах
+RECIPES_SQL = (
+    'INSERT INTO recipes_recipe (name, text, cooking_time, author_id, '
+    'image, pub_date, favorites_count, shopping_carts_count, '
+    'ingredient_ids, image_variants, image_placeholder) '
+    "SELECT %s || ' ' || n, '', "
+    "%s + floor(random() * %s)::int, %s, '', "
+    "now() - n * interval '1 minute', 0, 0, '{}', '{}', '' "
+    'FROM generate_series(1, %s) AS n'
+)
+LINKS_SQL = (
+    'INSERT INTO recipes_ingredientinrecipe (recipe_id, ingredient_id, '
+    'amount) SELECT recipe.id, '
+    '(%s::bigint[])[1 + floor(power(random(), 3) * %s)::int], 1 '
+    'FROM recipes_recipe AS recipe, '
+    'generate_series(1, recipe.cooking_time) '
+    'WHERE recipe.name LIKE %s ON CONFLICT DO NOTHING'
+)
+
+
+def legacy_exact(pantry):
+    """Без массива: рецепты без ингредиентов вне набора (anti-join)."""
+    links = IngredientInRecipe.objects.filter(recipe=OuterRef('pk'))
+    return Recipe.objects.filter(Exists(links)).exclude(
+        Exists(links.exclude(ingredient_id__in=pantry)))
+
+
+def legacy_missing(pantry, missing):
+    """Без массива: GROUP BY по связям с подсчётом совпавших."""
+    return IngredientInRecipe.objects.values('recipe').annotate(
+        total=Count('id'),
+        matched=Count('id', filter=Q(ingredient_id__in=pantry)),
+    ).annotate(
+        missing=F('total') - F('matched'),
+    ).filter(
+        matched__gt=0,
+        missing__lte=missing,
+    ).order_by('missing', '-recipe__pub_date', '-recipe')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение поиска "что приготовить": ingredient_ids с GIN-индексом '
+        'и запросы по связям. Синтетические рецепты создаются в транзакции '
+        'и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--min-ingredients', type=int, default=4)
+        parser.add_argument('--max-ingredients', type=int, default=12)
+        parser.add_argument('--pantry', type=int, default=40)
+        parser.add_argument('--missing', type=int, default=2)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, search, pantries):
+        """Среднее время на запрос: количество и первая страница, как
+        в ответе can_cook."""
+        counts = []
+        started = time.perf_counter()
+        for pantry in pantries:
+            queryset = search(pantry)
+            counts.append(queryset.count())
+            list(queryset[:PAGE_SIZE])
+        return (time.perf_counter() - started) / len(pantries), counts
+
+    def populate(self, ingredient_ids, options, generator):
+        author = User.objects.create(
+            username=PREFIX,
+            email=f'{PREFIX}@example.com',
+            first_name=PREFIX,
+            last_name=PREFIX,
+        )
+        spread = options['max_ingredients'] - options['min_ingredients'] + 1
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT setseed(%s)', (generator.random(), ))
+            cursor.execute(RECIPES_SQL, (
+                PREFIX,
+                options['min_ingredients'],
+                spread,
+                author.pk,
+                options['recipes'],
+            ))
+            cursor.execute(LINKS_SQL, (
+                ingredient_ids, len(ingredient_ids), f'{PREFIX} %'))
+        update_ingredient_ids(Recipe.objects.filter(
+            name__startswith=f'{PREFIX} '))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE recipes_recipe')
+            cursor.execute('ANALYZE recipes_ingredientinrecipe')
+
+    def used_index(self, queryset):
+        plan = queryset.explain()
+        return next((name for name in INDEXES if name in plan), 'нет')
+
+    def handle(self, *args, **options):
+        if options['min_ingredients'] < 1 or (
+                options['max_ingredients'] < options['min_ingredients']):
+            raise CommandError('Неверный диапазон числа ингредиентов')
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+        if not ingredient_ids:
+            self.stderr.write('Нет ингредиентов, сначала выполните import.')
+            return
+        generator = random.Random(options['seed'])
+        generator.shuffle(ingredient_ids)
+        pantries = [
+            {
+                ingredient_ids[int(generator.random() ** 3
+                                   * len(ingredient_ids))]
+                for _ in range(options['pantry'])
+            }
+            for _ in range(options['queries'])
+        ]
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.populate(ingredient_ids, options, generator)
+            self.stdout.write(
+                f'Рецептов: {Recipe.objects.count()}, ингредиентов: '
+                f'{len(ingredient_ids)}, подготовка: '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+            missing = options['missing']
+            for title, legacy, matched in (
+                ('Все ингредиенты есть', legacy_exact,
+                 lambda pantry: cookable(Recipe.objects.all(), pantry)),
+                (f'Не хватает не больше {missing}',
+                 lambda pantry: legacy_missing(pantry, missing),
+                 lambda pantry: cookable(
+                     Recipe.objects.all(), pantry, missing)),
+            ):
+                legacy_time, legacy_counts = self.measure(legacy, pantries)
+                matched_time, matched_counts = self.measure(matched, pantries)
+                self.stdout.write(f'{title}:')
+                self.stdout.write(
+                    f'  найдено в среднем: '
+                    f'{sum(matched_counts) / len(pantries):.1f}, '
+                    f'результаты совпадают: '
+                    f'{"да" if legacy_counts == matched_counts else "нет"}, '
+                    f'индекс: {self.used_index(matched(pantries[0]))}'
+                )
+                self.stdout.write(
+                    f'  по связям: {legacy_time * 1000:.1f} мс/запрос, '
+                    f'ingredient_ids: {matched_time * 1000:.1f} мс/запрос, '
+                    f'ускорение x{legacy_time / matched_time:.1f}'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,123 @@
+import base64
+import io
+import os
+import re
+import resource
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+from PIL import Image
+
+from recipes.images import create_executor
+
+FIELDS = (
+    ('drf-extra-fields', 'drf_extra_fields.fields.Base64ImageField'),
+    ('api.fields', 'api.fields.Base64ImageField'),
+)
+
+
+def reset_peak_rss():
+    """Сбрасывает пик RSS процесса; работает только в Linux."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss():
+    """Пик RSS процесса в байтах."""
+    try:
+        with open('/proc/self/status') as status:
+            return int(re.search(r'VmHWM:\s+(\d+)', status.read())[1]) * 1024
+    except (OSError, TypeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure_upload(field_path, payload_path):
+    """Выполняется в отдельном процессе: пик RSS считается от момента,
+    когда строка из JSON уже в памяти, до прочтения файла целиком, как
+    при сохранении в хранилище."""
+    with open(payload_path, encoding='ascii') as payload_file:
+        payload = payload_file.read()
+    exact = reset_peak_rss()
+    before = peak_rss()
+    started = time.perf_counter()
+    uploaded = import_string(field_path)().run_validation(payload)
+    for _ in uploaded.chunks():
+        pass
+    return (
+        peak_rss() - before,
+        time.perf_counter() - started,
+        exact,
+    )
+
+
+def make_payload(megapixels, quality):
+    """data-URI JPEG из шума: шум почти не сжимается, поэтому размер
+    файла близок к фотографии с большим количеством деталей."""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    image = Image.frombytes('RGB', (width, height), os.urandom(
+        width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return (
+        'data:image/jpeg;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    ), (width, height), buffer.tell()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пик памяти (RSS) при разборе изображения в base64 '
+        'полем из drf-extra-fields и потоковым полем api.fields. Каждый '
+        'замер выполняется в новом процессе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, default=12)
+        parser.add_argument('--quality', type=int, default=90)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        payload, size, file_size = make_payload(
+            options['megapixels'], options['quality'])
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.b64', encoding='ascii') as payload_file:
+            payload_file.write(payload)
+            payload_file.flush()
+            del payload
+            self.stdout.write(
+                f'Изображение {size[0]}x{size[1]}, файл '
+                f'{file_size / 2 ** 20:.1f} МБ, строка base64 '
+                f'{os.path.getsize(payload_file.name) / 2 ** 20:.1f} МБ'
+            )
+            results = {}
+            for title, field_path in FIELDS:
+                runs = []
+                for _ in range(options['repeat']):
+                    with create_executor(1) as executor:
+                        runs.append(executor.submit(
+                            measure_upload, field_path, payload_file.name,
+                        ).result())
+                peak = max(run[0] for run in runs)
+                duration = statistics.median(run[1] for run in runs)
+                results[title] = peak
+                self.stdout.write(
+                    f'{title}: пик RSS +{peak / 2 ** 20:.1f} МБ, '
+                    f'{duration * 1000:.0f} мс'
+                )
+                if not all(run[2] for run in runs):
+                    self.stdout.write(
+                        '  пик RSS не сбрасывается, в замер входит '
+                        'чтение строки')
+        old, new = (results[title] for title, _ in FIELDS)
+        self.stdout.write(
+            f'Экономия памяти на одну загрузку: {(old - new) / 2 ** 20:.1f} '
+            'МБ'
+        )
@@ -0,0 +1,57 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.autocomplete import IngredientIndex
+from recipes.models import Ingredient
+
+
+def legacy_search(value):
+    """Прежняя фильтрация IngredientFilters: два запроса к базе."""
+    queryset = Ingredient.objects.all()
+    startswith = queryset.filter(name__startswith=value)
+    icontains = queryset.filter(name__icontains=value).exclude(
+        name__startswith=value)
+    return list(startswith) + list(icontains)
+
+
+class Command(BaseCommand):
+    help = 'Сравнение поиска ингредиентов: запросы к базе и индекс в памяти'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, search, queries):
+        started = time.perf_counter()
+        for query in queries:
+            search(query)
+        return (time.perf_counter() - started) / len(queries)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stderr.write('Нет ингредиентов, сначала выполните import.')
+            return
+        generator = random.Random(options['seed'])
+        queries = [
+            name[:generator.randint(1, min(4, len(name)))]
+            for name in generator.choices(names, k=options['queries'])
+        ]
+        index = IngredientIndex()
+        started = time.perf_counter()
+        index.get_data()
+        self.stdout.write(
+            f'Ингредиентов: {len(names)}, построение индекса: '
+            f'{(time.perf_counter() - started) * 1000:.1f} мс'
+        )
+        legacy = self.measure(legacy_search, queries)
+        indexed = self.measure(
+            lambda query: index.search(query, limit=options['limit']),
+            queries,
+        )
+        self.stdout.write(f'Запросы к базе: {legacy * 1e6:.0f} мкс/запрос')
+        self.stdout.write(f'Индекс в памяти: {indexed * 1e6:.0f} мкс/запрос')
+        self.stdout.write(f'Ускорение: x{legacy / indexed:.1f}')
@@ -0,0 +1,98 @@
+import hashlib
+import time
+
+from django.core.management.base import BaseCommand
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.recipes.serializers import SmallRecipeSerializer
+from foodgram.constants import IMAGE_FORMATS, IMAGE_VARIANTS
+from recipes.models import Recipe
+
+
+class LegacyCardSerializer(SmallRecipeSerializer):
+    """Карточка с прежним полем изображения: ссылка через хранилище,
+    абсолютная, если в контексте есть запрос."""
+
+    image = Base64ImageField()
+
+    class Meta(SmallRecipeSerializer.Meta):
+        fields = (
+            'id',
+            'image',
+            'name',
+            'cooking_time',
+        )
+
+
+def stored_name(directory, key, extension):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'{directory}/{digest[:2]}/{digest}.{extension}'
+
+
+def make_cards(count):
+    """Рецепты в памяти с именами файлов как в хранилище по содержимому."""
+    return [
+        Recipe(
+            id=number,
+            name=f'Рецепт {number}',
+            cooking_time=number % 120 + 1,
+            image=stored_name('recipes/media', str(number), 'jpg'),
+            image_variants={
+                variant: {
+                    'width': size,
+                    'height': size,
+                    **{
+                        image_format: stored_name(
+                            'recipes/variants',
+                            f'{number}{variant}',
+                            image_format,
+                        )
+                        for image_format in IMAGE_FORMATS
+                    },
+                }
+                for variant, size in IMAGE_VARIANTS.items()
+            },
+            image_placeholder='LEHV6nWB2yk8pyo0adR*.7kCMdnj',
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Время сериализации карточек рецептов (избранное, список покупок, '
+        'подписки) с прежним полем изображения и с готовыми ссылками '
+        'на миниатюры.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def measure(self, serializer_class, cards, context):
+        best = None
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            data = serializer_class(cards, many=True, context=context).data
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, data[0]['image']
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        cards = make_cards(options['cards'])
+        context = {'request': Request(APIRequestFactory().get('/'))}
+        results = []
+        for title, serializer_class in (
+            ('Base64ImageField', LegacyCardSerializer),
+            ('ImageVariantField', SmallRecipeSerializer),
+        ):
+            elapsed, url = self.measure(serializer_class, cards, context)
+            results.append(elapsed)
+            self.stdout.write(
+                f'{title}: {elapsed * 1000:.1f} мс на {len(cards)} '
+                f'карточек, ссылка {url}'
+            )
+        self.stdout.write(f'Ускорение x{results[0] / results[1]:.1f}')
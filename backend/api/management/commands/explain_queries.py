@@ -0,0 +1,155 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+
+from foodgram.constants import PAGE_SIZE
+from recipes.autocomplete import TRIGRAM_INDEX, fold, fold_expression
+from recipes.matching import cookable
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    TagForRecipe,
+)
+from recipes.search import SEARCH_CONFIG
+from users.models import User
+
+PANTRY_SIZE = 30
+HOT_INDEXES = (
+    ('recipes_recipe', 'recipe_pub_date_id_idx', False),
+    ('recipes_recipe', 'recipe_author_pub_date_idx', False),
+    ('recipes_ingredient', TRIGRAM_INDEX, False),
+    ('recipes_recipescore', 'recipe_score_trending_idx', False),
+    ('recipes_recipe', 'recipe_search_vector_idx', False),
+    ('recipes_recipe', 'recipe_first_ingredient_idx', False),
+    ('recipes_recipe', 'recipe_ingredient_ids_idx', False),
+    ('recipes_ingredientinrecipe', 'unique_ingredient_recipe', True),
+    ('recipes_tagforrecipe', 'unique_tag_recipe', True),
+)
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN ANALYZE для основных запросов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='id пользователя, от имени которого строятся запросы',
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help=(
+                'Сначала показать планы без индексов HOT_INDEXES. Индексы '
+                'удаляются внутри транзакции, которая затем откатывается; '
+                'на время сравнения таблицы блокируются.'
+            ),
+        )
+
+    def get_queries(self, user):
+        recipes = Recipe.objects.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        ).select_related('author').order_by('-pub_date', '-id')
+        page = list(recipes.values_list('id', flat=True)[:PAGE_SIZE])
+        last = recipes[PAGE_SIZE * 50:].first() or recipes.last()
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:2])
+        ingredient = Ingredient.objects.order_by('?').first()
+        part = fold(ingredient.name[1:4]) if ingredient else 'ол'
+        pantry = list(Ingredient.objects.order_by('?').values_list(
+            'id', flat=True)[:PANTRY_SIZE])
+        search = SearchQuery(
+            ingredient.name if ingredient else 'соль',
+            config=SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        queries = {
+            'Лента рецептов': recipes[:PAGE_SIZE],
+            'Лента по курсору': recipes.filter(
+                Q(pub_date__lt=last.pub_date)
+                | Q(pub_date=last.pub_date, id__lt=last.id),
+                pub_date__lte=last.pub_date,
+            )[:PAGE_SIZE] if last else None,
+            'Лента автора': recipes.filter(author=user)[:PAGE_SIZE],
+            'Фильтр по тегам': recipes.filter(Exists(
+                TagForRecipe.objects.filter(
+                    recipe=OuterRef('pk'), tag_id__in=tag_ids)
+            ))[:PAGE_SIZE],
+            'Лента trending': recipes.filter(score__isnull=False).order_by(
+                '-score__trending', '-id')[:PAGE_SIZE],
+            'Лента trending по тегам': recipes.filter(
+                Exists(TagForRecipe.objects.filter(
+                    recipe=OuterRef('pk'), tag_id__in=tag_ids)),
+                score__isnull=False,
+            ).order_by('-score__trending', '-id')[:PAGE_SIZE],
+            'Полнотекстовый поиск': recipes.filter(
+                search_vector=search,
+            ).annotate(
+                rank=SearchRank(F('search_vector'), search),
+            ).order_by('-rank', '-pub_date', '-id')[:PAGE_SIZE],
+            'Что приготовить': cookable(recipes, pantry)[:PAGE_SIZE],
+            'Что приготовить, не хватает до 2': cookable(
+                recipes, pantry, 2)[:PAGE_SIZE],
+            'Избранное': recipes.filter(is_favorited=True)[:PAGE_SIZE],
+            'Ингредиенты страницы': IngredientInRecipe.objects.filter(
+                recipe_id__in=page).select_related('ingredient'),
+            'Теги страницы': TagForRecipe.objects.filter(
+                recipe_id__in=page).select_related('tag'),
+            'Список покупок': IngredientInRecipe.objects.filter(
+                recipe__shopping__user=user).values(
+                'ingredient__name',
+                'ingredient__measurement_unit').order_by(
+                'ingredient__name').annotate(amount=Sum('amount')),
+            'Подписки': User.objects.filter(
+                following__user=user,
+            ).order_by('username')[:PAGE_SIZE],
+            'Поиск ингредиента по части названия': Ingredient.objects.annotate(
+                folded_name=fold_expression('name'),
+            ).filter(folded_name__contains=part),
+        }
+        return {
+            title: queryset
+            for title, queryset in queries.items()
+            if queryset is not None
+        }
+
+    def explain(self, queries):
+        for title, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(queryset.explain(analyze=True) + '\n')
+
+    def drop_hot_indexes(self):
+        with connection.cursor() as cursor:
+            for table, name, is_constraint in HOT_INDEXES:
+                if is_constraint:
+                    cursor.execute(
+                        f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS '
+                        f'{name}'
+                    )
+                else:
+                    cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(pk=options['user']).first()
+        else:
+            user = User.objects.annotate(
+                carts=Count('shoppingcart')).order_by('-carts').first()
+        if user is None:
+            raise CommandError('Нет пользователя для построения запросов.')
+        queries = self.get_queries(user)
+        if options['compare']:
+            self.stdout.write(self.style.WARNING('=== Без индексов ==='))
+            with transaction.atomic():
+                self.drop_hot_indexes()
+                self.explain(queries)
+                transaction.set_rollback(True)
+            self.stdout.write(self.style.WARNING('=== С индексами ==='))
+        self.explain(queries)
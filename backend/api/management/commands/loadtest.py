@@ -0,0 +1,276 @@
+import asyncio
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.counters import remove_counted_many
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from users.models import User
+
+SERVERS = {
+    'wsgi': ('foodgram.wsgi', ),
+    'asgi': (
+        'foodgram.asgi',
+        '--worker-class',
+        'uvicorn.workers.UvicornWorker',
+    ),
+}
+HOST = '127.0.0.1'
+
+
+class Client:
+    """Запросы по кругу по одному соединению (gunicorn с синхронными
+    воркерами закрывает его после каждого ответа). Позиция в наборе
+    сохраняется между прогонами, чтобы добавление и удаление из
+    избранного не разрывались между прогревом и замером."""
+
+    def __init__(self, port, requests):
+        self.port = port
+        self.requests = requests
+        self.position = 0
+
+    def run(self, deadline):
+        connection = http.client.HTTPConnection(HOST, self.port, timeout=60)
+        latencies = []
+        errors = 0
+        while time.perf_counter() < deadline:
+            method, path, headers = self.requests[
+                self.position % len(self.requests)]
+            self.position += 1
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+        connection.close()
+        return latencies, errors
+
+
+class LatencyProxy:
+    """TCP-прокси к базе в отдельном потоке: каждый ответ базы
+    задерживается на latency секунд, как при базе на другом хосте."""
+
+    def __init__(self, host, port, latency):
+        self.target = (host, port)
+        self.latency = latency
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(
+            self.handle, HOST, 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    async def pipe(self, reader, writer, delay):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection(
+                *self.target)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(
+            self.pipe(client_reader, server_writer, 0),
+            self.pipe(server_reader, client_writer, self.latency),
+        )
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест горячих эндпоинтов: по очереди запускает '
+        'gunicorn с WSGI и с ASGI (воркеры uvicorn) с одинаковым числом '
+        'воркеров и сравнивает запросы в секунду и p99 задержки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=('wsgi', 'asgi', 'both'), default='both')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=15)
+        parser.add_argument('--warmup', type=float, default=3)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--db-latency',
+            type=float,
+            default=0,
+            help='Задержка ответов базы в миллисекундах (через прокси)',
+        )
+        parser.add_argument(
+            '--user',
+            help='Пользователь для подписок и переключения избранного '
+                 'и списка покупок; без него — только анонимное чтение',
+        )
+
+    def build_requests(self, options, user):
+        """Набор запросов каждого клиента. Клиент переключает избранное
+        и список покупок своего рецепта, которого ещё нет у пользователя
+        ни там, ни там, чтобы клиенты не получали ошибок «уже добавлен»."""
+        recipes = Recipe.objects.all()
+        headers = {}
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            headers['Authorization'] = f'Token {token.key}'
+            recipes = recipes.exclude(
+                favorite_recipe__user=user).exclude(shopping__user=user)
+        self.recipe_ids = list(
+            recipes.values_list('pk', flat=True)[:options['concurrency']])
+        if not self.recipe_ids:
+            raise CommandError('Нет рецептов для нагрузочного теста.')
+        ingredient = Ingredient.objects.order_by('pk').first()
+        prefix = quote(ingredient.name[:2]) if ingredient else 'а'
+        clients = []
+        for number in range(options['concurrency']):
+            recipe_id = self.recipe_ids[number % len(self.recipe_ids)]
+            requests = [
+                ('GET', '/api/recipes/', headers),
+                ('GET', f'/api/recipes/{recipe_id}/', headers),
+                ('GET', f'/api/ingredients/?name={prefix}', headers),
+                ('GET', '/api/tags/', headers),
+            ]
+            if headers:
+                requests += [
+                    ('GET', '/api/users/subscriptions/', headers),
+                    ('POST', f'/api/recipes/{recipe_id}/favorite/', headers),
+                    ('DELETE', f'/api/recipes/{recipe_id}/favorite/',
+                     headers),
+                    ('POST', f'/api/recipes/{recipe_id}/shopping_cart/',
+                     headers),
+                    ('DELETE', f'/api/recipes/{recipe_id}/shopping_cart/',
+                     headers),
+                ]
+            clients.append(Client(
+                options['port'],
+                requests[number % len(requests):]
+                + requests[:number % len(requests)],
+            ))
+        return clients
+
+    def start_server(self, mode, options):
+        env = os.environ.copy()
+        if self.proxy is not None:
+            env.update(DB_HOST=HOST, DB_PORT=str(self.proxy.port))
+        server = subprocess.Popen(
+            (
+                sys.executable, '-m', 'gunicorn', *SERVERS[mode],
+                '--bind', f'{HOST}:{options["port"]}',
+                '--workers', str(options['workers']),
+            ),
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер {mode} не запустился.')
+            try:
+                socket.create_connection((HOST, options['port'])).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'Сервер {mode} не ответил за 30 секунд.')
+
+    def load(self, clients, duration):
+        deadline = time.perf_counter() + duration
+        with ThreadPoolExecutor(len(clients)) as executor:
+            results = list(executor.map(
+                lambda client: client.run(deadline), clients))
+        latencies = [
+            latency for client, _ in results for latency in client]
+        return latencies, sum(errors for _, errors in results)
+
+    def measure(self, mode, clients, options):
+        server = self.start_server(mode, options)
+        try:
+            self.load(clients, options['warmup'])
+            latencies, errors = self.load(clients, options['duration'])
+        finally:
+            server.terminate()
+            server.wait()
+        rps = len(latencies) / options['duration']
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f'{mode.upper()}: {len(latencies)} запросов, {rps:.0f} в секунду, '
+            f'p50 {percentiles[49] * 1000:.1f} мс, '
+            f'p99 {percentiles[98] * 1000:.1f} мс, ошибок {errors}'
+        )
+        return rps, percentiles[98]
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь {options["user"]} не найден.')
+        clients = self.build_requests(options, user)
+        self.proxy = None
+        if options['db_latency']:
+            database = settings.DATABASES['default']
+            self.proxy = LatencyProxy(
+                database['HOST'] or HOST,
+                int(database['PORT'] or 5432),
+                options['db_latency'] / 1000,
+            )
+        modes = ('wsgi', 'asgi') if options['mode'] == 'both' else (
+            options['mode'], )
+        self.stdout.write(
+            f'Воркеров: {options["workers"]}, клиентов: '
+            f'{options["concurrency"]}, запросов в наборе: '
+            f'{len(clients[0].requests)}, '
+            f'{options["duration"]:.0f} с на режим, '
+            f'задержка базы {options["db_latency"]:.0f} мс'
+        )
+        try:
+            results = {
+                mode: self.measure(mode, clients, options) for mode in modes}
+        finally:
+            if self.proxy is not None:
+                self.proxy.close()
+            if user is not None:
+                # Прогон мог закончиться между добавлением и удалением
+                for model in (Favorite, ShoppingCart):
+                    remove_counted_many(
+                        model, user=user, recipe_id=self.recipe_ids)
+        if len(results) == 2:
+            (wsgi_rps, wsgi_p99), (asgi_rps, asgi_p99) = results.values()
+            self.stdout.write(
+                f'ASGI/WSGI: запросы в секунду x{asgi_rps / wsgi_rps:.2f}, '
+                f'p99 x{asgi_p99 / wsgi_p99:.2f}'
+            )
@@ -0,0 +1,82 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date
+
+from foodgram.cache import get_version
+from foodgram.constants import REFERENCE_CACHE_TIMEOUT
+from users.models import Follow
+
+
+class FollowedAuthorsMixin:
+    """Один запрос подписок пользователя на весь запрос к API."""
+
+    def get_followed_authors(self):
+        if not hasattr(self, '_followed_authors'):
+            user = self.request.user
+            self._followed_authors = set()
+            if user.is_authenticated:
+                self._followed_authors = set(
+                    Follow.objects.filter(user=user).values_list(
+                        'author_id', flat=True)
+                )
+        return self._followed_authors
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['followed_authors'] = SimpleLazyObject(
+            self.get_followed_authors
+        )
+        return context
+
+
+class VersionedCacheMixin:
+    """Кеширует готовый JSON списка до изменения данных моделей.
+
+    Ключ включает версии моделей из cache_models, которые увеличиваются
+    сигналами post_save/post_delete, поэтому старые записи не удаляются,
+    а просто перестают читаться.
+    """
+
+    cache_models = ()
+
+    def get_cache_key(self, request):
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        versions = ':'.join(
+            str(get_version(model)) for model in self.cache_models
+        )
+        return (
+            f'{self.basename}:list:{versions}:'
+            f'{hashlib.md5(params.encode()).hexdigest()}'
+        )
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = super().list(request, *args, **kwargs)
+            content = request.accepted_renderer.render(response.data)
+            entry = {
+                'content': content,
+                'etag': f'"{hashlib.md5(content).hexdigest()}"',
+                'last_modified': int(time.time()),
+            }
+            cache.set(key, entry, REFERENCE_CACHE_TIMEOUT)
+        response = HttpResponse(
+            entry['content'], content_type='application/json'
+        )
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        return get_conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=entry['last_modified'],
+            response=response,
+        )
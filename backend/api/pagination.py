@@ -1,8 +1,215 @@
+import hashlib
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-from foodgram.constants import PAGE_SIZE
+from foodgram.constants import COUNT_CACHE_TIMEOUT, PAGE_SIZE
 
 
 class FoodgramPagination (PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = PAGE_SIZE
+
+
+class CountPage(Page):
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self.next_exists = has_next
+
+    def has_next(self):
+        return self.next_exists
+
+
+class CountPaginator(Paginator):
+    """Количество только для ответа: оно может быть оценкой или
+    устаревшим значением из кеша, поэтому номер страницы с ним не
+    сверяется. Наличие следующей страницы определяется по лишней
+    строке в выборке."""
+
+    def __init__(self, object_list, per_page, get_count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+
+    @cached_property
+    def count(self):
+        return self.get_count(self.object_list)
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        return CountPage(
+            rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+
+class CachedCountPagination(FoodgramPagination):
+    """Общее количество объектов без COUNT(*) на каждый запрос.
+
+    Для списков без фильтров с числом строк выше порога берется оценка
+    планировщика из pg_class.reltuples, остальные количества хранятся
+    в кеше COUNT_CACHE_TIMEOUT секунд по нормализованным параметрам.
+    И оценка, и количество из кеша отдаются с count_is_approximate=True;
+    страницы за пределами такого количества всё равно отдаются.
+    """
+
+    ignored_count_params = ('page', 'limit', 'cursor')
+
+    def django_paginator_class(self, queryset, page_size):
+        return CountPaginator(queryset, page_size, self.get_count)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_is_approximate = False
+        self.count_cache_key = self.get_count_cache_key(request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count_cache_key(self, request):
+        params = urlencode(sorted(
+            (key, value)
+            for key, value in request.query_params.lists()
+            if key not in self.ignored_count_params
+        ), doseq=True)
+        user = request.user.pk if request.user.is_authenticated else ''
+        return 'page-count:' + hashlib.md5(
+            f'{request.path}?{params}:{user}'.encode()
+        ).hexdigest()
+
+    def get_estimated_count(self, queryset):
+        if queryset.query.where or queryset.query.distinct:
+            return None
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                (queryset.model._meta.db_table, ),
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.APPROXIMATE_COUNT_THRESHOLD:
+            return None
+        return row[0]
+
+    def get_count(self, queryset):
+        """Точным считается только COUNT(*), выполненный в этом запросе:
+        значение из кеша могло устареть на COUNT_CACHE_TIMEOUT секунд."""
+        count = cache.get(self.count_cache_key)
+        if count is not None:
+            self.count_is_approximate = True
+            return count
+        count = self.get_estimated_count(queryset)
+        self.count_is_approximate = count is not None
+        if count is None:
+            count = queryset.count()
+        cache.set(self.count_cache_key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_approximate', self.count_is_approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class RecipePagination(CachedCountPagination):
+    """Постраничная выдача по номеру страницы или по курсору.
+
+    С параметром cursor (в том числе пустым) страница выбирается по ключу
+    (pub_date, id) без OFFSET и COUNT(*). Курсор работает только для
+    сортировки по умолчанию, с параметрами ordering, search и missing он
+    игнорируется.
+    """
+
+    cursor_query_param = 'cursor'
+    ordering_query_params = ('ordering', 'search', 'missing')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_query_param in request.query_params
+            and not any(
+                request.query_params.get(param)
+                for param in self.ordering_query_params
+            )
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-pub_date', '-id')
+        position = self.decode_cursor(request)
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk),
+                pub_date__lte=pub_date,
+            )
+        results = list(queryset[:page_size + 1])
+        self.page = results[:page_size]
+        self.has_next = len(results) > page_size
+        return self.page
+
+    def decode_cursor(self, request):
+        cursor = request.query_params[self.cursor_query_param]
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = b64decode(cursor.encode()).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def encode_cursor(self, recipe):
+        return b64encode(
+            f'{recipe.pub_date.isoformat()}|{recipe.id}'.encode()
+        ).decode()
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
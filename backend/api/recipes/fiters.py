@@ -1,27 +1,71 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.cache import cache
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Recipe, Tag
+from foodgram.cache import get_version
+from foodgram.constants import REFERENCE_CACHE_TIMEOUT
+from recipes.autocomplete import ingredient_index
+from recipes.models import Recipe, Tag, TagForRecipe
+from recipes.search import SEARCH_CONFIG
 from users.models import User
 
+TAGS_MODE_ANY = 'any'
+TAGS_MODE_ALL = 'all'
+ORDERING_POPULAR = 'popular'
+ORDERING_TRENDING = 'trending'
 
-class IngredientFilters(SearchFilter):
+
+def get_tag_ids():
+    """Соответствие slug -> id тегов, кешируется до изменения тегов."""
+    key = f'tags:ids:{get_version(Tag)}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, REFERENCE_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+class IngredientFilters(BaseFilterBackend):
     search_param = 'name'
+    limit_param = 'limit'
 
     def filter_queryset(self, request, queryset, view):
-        search_value = request.query_params.get(self.search_param, '')
-        if search_value:
-            startswith = queryset.filter(name__startswith=search_value)
-            icontains = queryset.filter(name__icontains=search_value).exclude(
-                name__startswith=search_value)
-        return list(startswith) + list(icontains)
+        if view.action != 'list':
+            return queryset
+        limit = request.query_params.get(self.limit_param, '')
+        return ingredient_index.search(
+            request.query_params.get(self.search_param, ''),
+            limit=(int(limit) or None) if limit.isdigit() else None,
+        )
 
 
 class RecipeFilters(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        to_field_name='slug',
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags',
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=(
+            (TAGS_MODE_ANY, TAGS_MODE_ANY),
+            (TAGS_MODE_ALL, TAGS_MODE_ALL),
+        ),
+        method='get_tags_mode',
+    )
+    search = filters.CharFilter(
+        method='get_search',
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(
+            (ORDERING_POPULAR, ORDERING_POPULAR),
+            (ORDERING_TRENDING, ORDERING_TRENDING),
+        ),
+        method='get_ordering',
     )
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all()
@@ -37,21 +81,47 @@ class RecipeFilters(FilterSet):
         model = Recipe
         fields = (
             'tags',
+            'tags_mode',
+            'search',
+            'ordering',
             'author',
             'is_favorited',
             'is_in_shopping_cart',
         )
 
+    def get_tags(self, queryset, name, value):
+        tag_ids = get_tag_ids()
+        tag_ids = [tag_ids[slug] for slug in value if slug in tag_ids]
+        if self.form.cleaned_data.get('tags_mode') == TAGS_MODE_ALL:
+            for tag_id in tag_ids:
+                queryset = queryset.filter(Exists(TagForRecipe.objects.filter(
+                    recipe=OuterRef('pk'), tag_id=tag_id)))
+            return queryset
+        return queryset.filter(Exists(TagForRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_ids)))
+
+    def get_tags_mode(self, queryset, name, value):
+        return queryset
+
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск по search_vector (GIN-индекс), самые
+        релевантные — первыми; явный ordering сортирует по-своему."""
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+        ).order_by('-rank', '-pub_date', '-id')
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.filter(score__isnull=False).order_by(
+            f'-score__{value}', '-id')
+
     def get_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(
-                favorite_recipe__user=self.request.user
-            )
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(
-                shopping__user=self.request.user
-            )
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
@@ -0,0 +1,73 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListMixin:
+    """Рендерер списка покупок; каждый наследник описывает stream(),
+    который по строкам из базы отдаёт части ответа."""
+
+    charset = 'utf-8'
+
+
+class ShoppingListTextRenderer(ShoppingListMixin, BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, ingredients):
+        yield 'Список покупок:\n'
+        for ingredient in ingredients:
+            yield (
+                f'\n{ingredient["ingredient__name"]} - '
+                f'{ingredient["amount"]} '
+                f'{ingredient["ingredient__measurement_unit"]}'
+            )
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    class Echo:
+        def write(self, value):
+            return value
+
+    def stream(self, ingredients):
+        writer = csv.writer(self.Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['amount'],
+            ))
+
+
+class ShoppingListJSONRenderer(ShoppingListMixin, JSONRenderer):
+
+    def stream(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            yield separator + json.dumps(
+                {
+                    'name': ingredient['ingredient__name'],
+                    'measurement_unit': (
+                        ingredient['ingredient__measurement_unit']),
+                    'amount': ingredient['amount'],
+                },
+                ensure_ascii=False,
+                separators=(',', ':'),
+            )
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+)
@@ -1,14 +1,34 @@
-from drf_extra_fields.fields import Base64ImageField
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from rest_framework.serializers import (
     IntegerField,
+    ListField,
+    ListSerializer,
     ModelSerializer,
-    PrimaryKeyRelatedField,
     ReadOnlyField,
+    Serializer,
     SerializerMethodField,
     ValidationError,
 )
+from rest_framework.validators import UniqueTogetherValidator
 
+from api.fields import Base64ImageField, ImageVariantField
 from api.users.serializers import FoodgramUserSerializer
+from foodgram.constants import (
+    MAX_BULK_RECIPES,
+    MAX_INGREDIENT_AMOUNT,
+    MAX_MISSING_INGREDIENTS,
+    MAX_PANTRY_INGREDIENTS,
+    MIN_VALUE_FOR_RECIPE,
+    RECIPE_CACHE_TIMEOUT,
+)
+from recipes.cache import recipe_cache_keys
+from recipes.images import image_uploaded
+from recipes.matching import update_ingredient_ids
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -17,12 +37,21 @@ from recipes.models import (
     ShoppingCart,
     Tag,
 )
+from recipes.search import update_search_vectors
 from users.models import User
 
+RECIPE_PREFETCH = (
+    'tags',
+    Prefetch(
+        'recipe_ingredient',
+        queryset=IngredientInRecipe.objects.select_related('ingredient'),
+    ),
+)
+
 
 class FollowUserSerializer(FoodgramUserSerializer):
     recipes = SerializerMethodField(method_name='get_recipes')
-    recipes_count = SerializerMethodField(method_name='get_recipes_count')
+    recipes_count = ReadOnlyField()
 
     class Meta:
         model = User
@@ -38,20 +67,19 @@ class FollowUserSerializer(FoodgramUserSerializer):
         )
 
     def get_recipes(self, data):
-        limit = int(self.context['request'].query_params.get(
-            'recipes_limit', default=0)
-        )
-        recipes = data.recipes.all()
-        if limit > 0:
-            recipes = recipes[:limit]
+        if hasattr(data, 'limited_recipes'):
+            recipes = data.limited_recipes
+        else:
+            limit = self.context['request'].query_params.get(
+                'recipes_limit', '')
+            recipes = data.recipes.all()
+            if limit.isdigit() and int(limit) > 0:
+                recipes = recipes[:int(limit)]
         return SmallRecipeSerializer(
             recipes,
             many=True,
         ).data
 
-    def get_recipes_count(self, data):
-        return data.recipes.count()
-
 
 class TagSerializer(ModelSerializer):
 
@@ -74,27 +102,19 @@ class IngredientSerializer(ModelSerializer):
             'name',
             'measurement_unit',
         )
+        validators = [
+            UniqueTogetherValidator(
+                queryset=Ingredient.objects.all(),
+                fields=('name', 'measurement_unit'),
+                message='Такой ингредиент уже есть',
+            )
+        ]
 
 
 class IngredientForRecipeSerializer(ModelSerializer):
-    id = SerializerMethodField(
-        method_name='get_ingredient_id',
-    )
-    name = SerializerMethodField(
-        method_name='get_ingredient_name'
-    )
-    measurement_unit = SerializerMethodField(
-        method_name='get_ingredient_measure'
-    )
-
-    def get_ingredient_id(self, data):
-        return data.ingredient.id
-
-    def get_ingredient_name(self, data):
-        return data.ingredient.name
-
-    def get_ingredient_measure(self, data):
-        return data.ingredient.measurement_unit
+    id = ReadOnlyField(source='ingredient.id')
+    name = ReadOnlyField(source='ingredient.name')
+    measurement_unit = ReadOnlyField(source='ingredient.measurement_unit')
 
     class Meta:
         model = IngredientInRecipe
@@ -106,8 +126,39 @@ class IngredientForRecipeSerializer(ModelSerializer):
         )
 
 
+class RecipeListSerializer(ListSerializer):
+    """Представления всех рецептов страницы одним запросом к кешу."""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        fragments = self.child.get_fragments(recipes)
+        return [
+            self.child.add_uncached_fields(recipe, fragments[recipe.pk])
+            for recipe in recipes
+        ]
+
+
 class RecipeSerializer(ModelSerializer):
-    image = ReadOnlyField(source='image.url')
+    """Рецепт с кешем общей для всех пользователей части представления.
+
+    Теги, автор и ингредиенты берутся из кеша recipes.cache, который
+    сбрасывается сигналами; предзагрузка связей выполняется только для
+    промахов. Поля uncached_fields и is_subscribed автора зависят от
+    пользователя или меняются без сигналов (варианты изображения
+    сохраняет пул обработки), поэтому добавляются на каждый запрос.
+    """
+
+    uncached_fields = (
+        'is_favorited',
+        'is_in_shopping_cart',
+        'favorites_count',
+        'shopping_carts_count',
+        'image',
+        'image_jpeg',
+        'image_placeholder',
+    )
+    image = ImageVariantField()
+    image_jpeg = ImageVariantField(image_format='jpeg')
     tags = TagSerializer(
         many=True
     )
@@ -118,7 +169,7 @@ class RecipeSerializer(ModelSerializer):
 
     def get_ingredients(self, data):
         ingredients = IngredientForRecipeSerializer(
-            IngredientInRecipe.objects.filter(recipe=data), many=True
+            data.recipe_ingredient.all(), many=True
         )
         return ingredients.data
 
@@ -136,6 +187,8 @@ class RecipeSerializer(ModelSerializer):
             'id',
             'tags',
             'image',
+            'image_jpeg',
+            'image_placeholder',
             'author',
             'ingredients',
             'name',
@@ -143,18 +196,96 @@ class RecipeSerializer(ModelSerializer):
             'cooking_time',
             'is_favorited',
             'is_in_shopping_cart',
+            'favorites_count',
+            'shopping_carts_count',
+        )
+        read_only_fields = (
+            'image_placeholder',
+            'favorites_count',
+            'shopping_carts_count',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def get_cached_field_names(self):
+        return {
+            field.field_name for field in self._readable_fields
+            if field.field_name not in self.uncached_fields
+        }
+
+    def get_fragment(self, recipe):
+        fragment = {
+            field.field_name: field.to_representation(
+                field.get_attribute(recipe))
+            for field in self._readable_fields
+            if field.field_name not in self.uncached_fields
+        }
+        fragment['author'].pop('is_subscribed', None)
+        return fragment
+
+    def get_fragments(self, recipes):
+        """Общие части представлений по id рецепта. Записи с другим
+        набором полей (после изменения сериализатора) считаются промахом.
+
+        С recipe_cache=False в контексте кеш не читается и не заполняется:
+        так отвечают на запись, пока старая запись в кеше ещё не удалена
+        после фиксации транзакции. Без общего кеша (settings.RECIPE_CACHE)
+        кеш не используется вовсе.
+        """
+        keys = {}
+        if settings.RECIPE_CACHE and self.context.get('recipe_cache', True):
+            keys = recipe_cache_keys({recipe.pk for recipe in recipes})
+        cached = cache.get_many(list(keys.values()))
+        names = self.get_cached_field_names()
+        fragments = {
+            recipe_id: cached[key]
+            for recipe_id, key in keys.items()
+            if key in cached and cached[key].keys() == names
+        }
+        missing = [
+            recipe for recipe in recipes if recipe.pk not in fragments]
+        if missing:
+            prefetch_related_objects(missing, *RECIPE_PREFETCH)
+            for recipe in missing:
+                fragments[recipe.pk] = self.get_fragment(recipe)
+        if missing and keys:
+            cache.set_many(
+                {keys[recipe.pk]: fragments[recipe.pk] for recipe in missing},
+                RECIPE_CACHE_TIMEOUT,
+            )
+        return fragments
+
+    def add_uncached_fields(self, recipe, fragment):
+        data = OrderedDict()
+        for field in self._readable_fields:
+            name = field.field_name
+            if name in self.uncached_fields:
+                data[name] = field.to_representation(
+                    field.get_attribute(recipe))
+            else:
+                data[name] = fragment[name]
+        data['author'] = OrderedDict(
+            data['author'],
+            is_subscribed=self.fields['author'].get_is_subscribed(
+                recipe.author),
+        )
+        return data
+
+    def to_representation(self, recipe):
+        return self.add_uncached_fields(
+            recipe, self.get_fragments([recipe])[recipe.pk])
 
     def get_is_favorited(self, recipe):
-        request = self.context.get('request')
-        user = request.user
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
+        user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return Favorite.objects.filter(user=user, recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, recipe):
-        request = self.context.get('request')
-        user = request.user
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
+        user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return ShoppingCart.objects.filter(user=user, recipe=recipe).exists()
@@ -162,7 +293,10 @@ class RecipeSerializer(ModelSerializer):
 
 class CreateIngredientForRecipeSerializer(ModelSerializer):
     id = IntegerField()
-    amount = IntegerField()
+    amount = IntegerField(
+        min_value=MIN_VALUE_FOR_RECIPE,
+        max_value=MAX_INGREDIENT_AMOUNT,
+    )
 
     class Meta:
         model = Ingredient
@@ -174,10 +308,7 @@ class CreateIngredientForRecipeSerializer(ModelSerializer):
 
 class CreateRecipeSerializer(ModelSerializer):
     image = Base64ImageField()
-    tags = PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = ListField(child=IntegerField())
     ingredients = CreateIngredientForRecipeSerializer(many=True)
 
     def validate_tags(self, tags):
@@ -185,6 +316,13 @@ class CreateRecipeSerializer(ModelSerializer):
             raise ValidationError(
                 'Добавьте тег'
             )
+        if len(tags) != len(set(tags)):
+            raise ValidationError('Одинаковые теги')
+        missing = set(tags) - Tag.objects.in_bulk(tags).keys()
+        if missing:
+            raise ValidationError(
+                f'Теги не найдены: {sorted(missing)}'
+            )
         return tags
 
     def validate_ingredients(self, ingredients):
@@ -197,37 +335,83 @@ class CreateRecipeSerializer(ModelSerializer):
             ingredients_list.append(ingredient_id['id'])
         if len(ingredients_list) != len(set(ingredients_list)):
             raise ValidationError('Одинаковые ингредиенты')
+        missing = (
+            set(ingredients_list)
+            - Ingredient.objects.in_bulk(ingredients_list).keys()
+        )
+        if missing:
+            raise ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}'
+            )
         return ingredients
 
+    def set_ingredients(self, recipe, ingredients_data):
+        amounts = {
+            ingredient_data['id']: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        current = {
+            ingredient.ingredient_id: ingredient
+            for ingredient in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed,
+            ).delete()
+        changed = []
+        for ingredient_id, ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and ingredient.amount != amount:
+                ingredient.amount = amount
+                changed.append(ingredient)
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ('amount', ))
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags_data)
-        for ingredient_data in ingredients_data:
-            ingredient = Ingredient.objects.get(pk=ingredient_data['id'])
-            amount = ingredient_data['amount']
-            IngredientInRecipe.objects.create(
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
                 recipe=recipe,
-                ingredient=ingredient,
-                amount=amount
+                ingredient_id=ingredient_data['id'],
+                amount=ingredient_data['amount'],
             )
+            for ingredient_data in ingredients_data
+        )
+        update_search_vectors([recipe.pk])
+        update_ingredient_ids([recipe.pk])
+        image_uploaded(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags_data = validated_data.pop('tags')
-        ingredients_data = validated_data.pop('ingredients')
-        instance.tags.set(tags_data)
-        instance.ingredients.clear()
-        for ingredient_data in ingredients_data:
-            ingredient = Ingredient.objects.get(pk=ingredient_data['id'])
-            amount = ingredient_data['amount']
-            IngredientInRecipe.objects.create(
-                recipe=instance,
-                ingredient=ingredient,
-                amount=amount
-            )
-        return super().update(instance, validated_data)
+        tags_data = validated_data.pop('tags', None)
+        ingredients_data = validated_data.pop('ingredients', None)
+        old_image = instance.image.name
+        if tags_data is not None:
+            instance.tags.set(tags_data)
+        if ingredients_data is not None:
+            self.set_ingredients(instance, ingredients_data)
+        recipe = super().update(instance, validated_data)
+        image_uploaded(recipe, old_image)
+        update_search_vectors([recipe.pk])
+        if ingredients_data is not None:
+            update_ingredient_ids([recipe.pk])
+        return recipe
 
     class Meta:
         model = Recipe
@@ -244,20 +428,19 @@ class CreateRecipeSerializer(ModelSerializer):
     def to_representation(self, recipe):
         return RecipeSerializer(
             recipe,
-            context={
-                'request': self.context.get('request'),
-            }
+            context={**self.context, 'recipe_cache': False}
         ).data
 
 
 class SmallRecipeSerializer(ModelSerializer):
-    image = Base64ImageField()
+    image = ImageVariantField('thumbnail')
 
     class Meta:
         model = Recipe
         fields = (
             'id',
             'image',
+            'image_placeholder',
             'name',
             'cooking_time',
         )
@@ -279,3 +462,46 @@ class FavoriteSerializer(ModelSerializer):
                 'request': self.context.get('request'),
             }
         ).data
+
+
+class BulkRecipesSerializer(Serializer):
+    recipes = ListField(
+        child=IntegerField(),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES,
+        error_messages={
+            'empty': 'Добавьте рецепт',
+            'max_length': (
+                f'Не больше {MAX_BULK_RECIPES} рецептов за один запрос'),
+        },
+    )
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
+
+
+class CanCookSerializer(Serializer):
+    ingredients = ListField(
+        child=IntegerField(),
+        allow_empty=False,
+        max_length=MAX_PANTRY_INGREDIENTS,
+        error_messages={
+            'empty': 'Добавьте ингредиент',
+            'max_length': (
+                f'Не больше {MAX_PANTRY_INGREDIENTS} ингредиентов'),
+        },
+    )
+    missing = IntegerField(
+        min_value=0,
+        max_value=MAX_MISSING_INGREDIENTS,
+        default=0,
+    )
+
+
+class CookableRecipeSerializer(RecipeSerializer):
+    uncached_fields = RecipeSerializer.uncached_fields + (
+        'missing_ingredients', )
+    missing_ingredients = ReadOnlyField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('missing_ingredients', )
@@ -1,5 +1,7 @@
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Exists, OuterRef, Value
 from django.db.models.aggregates import Sum
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
@@ -8,16 +10,29 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from api.pagination import FoodgramPagination
+from api.mixins import FollowedAuthorsMixin, VersionedCacheMixin
+from api.pagination import RecipePagination
 from api.permissions import IsAdminOrAuthor, IsAdminOrReader
 from api.recipes.fiters import IngredientFilters, RecipeFilters
+from api.recipes.renderers import SHOPPING_LIST_RENDERERS
 from api.recipes.serializers import (
+    BulkRecipesSerializer,
+    CanCookSerializer,
+    CookableRecipeSerializer,
     CreateRecipeSerializer,
     FavoriteSerializer,
     IngredientSerializer,
     RecipeSerializer,
     TagSerializer,
 )
+from foodgram.constants import SHOPPING_LIST_CHUNK_SIZE
+from recipes.counters import (
+    add_counted,
+    add_counted_many,
+    remove_counted,
+    remove_counted_many,
+)
+from recipes.matching import cookable
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -28,29 +43,45 @@ from recipes.models import (
 )
 
 
-class TagViewSet(ModelViewSet):
+class TagViewSet(VersionedCacheMixin, ModelViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     permission_classes = (IsAdminOrReader, )
     pagination_class = None
+    cache_models = (Tag, )
 
 
-class IngredientViewSet(ModelViewSet):
+class IngredientViewSet(VersionedCacheMixin, ModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     permission_classes = (IsAdminOrReader, )
     filter_backends = (IngredientFilters, )
     pagination_class = None
+    cache_models = (Ingredient, )
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(FollowedAuthorsMixin, ModelViewSet):
 
-    queryset = Recipe.objects.all()
     permission_classes = (IsAdminOrAuthor, )
-    pagination_class = FoodgramPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilters
 
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related('author')
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
     def get_serializer_class(self):
         if self.request.method == 'POST' or self.request.method == 'PATCH':
             return CreateRecipeSerializer
@@ -59,101 +90,145 @@ class RecipeViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    @action(
-        permission_classes=(IsAuthenticated, ),
-        methods=['POST', 'DELETE'],
-        detail=True,
-    )
-    def favorite(self, request, pk):
+    def add_or_remove(self, request, pk, model, exists_error, missing_error):
         if request.method == 'POST':
             recipe = get_object_or_404(Recipe, id=pk)
-            serializer = FavoriteSerializer(recipe)
-            if not Favorite.objects.filter(
-                    user=request.user, recipe=recipe,).exists():
-                Favorite.objects.create(user=request.user, recipe=recipe,)
+            if not add_counted(model, user=request.user, recipe=recipe):
                 return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
+                    {'errors': exists_error},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
             return Response(
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if request.method == 'DELETE':
-            recipe = get_object_or_404(Recipe, id=pk)
-            favorite_for_removre = Favorite.objects.filter(
-                user=request.user,
-                recipe=recipe
+                FavoriteSerializer(recipe).data,
+                status=status.HTTP_201_CREATED
             )
-            if favorite_for_removre.exists():
-                favorite_for_removre.delete()
-                return Response(
-                    {'detail': 'Рецепт успешно удален'},
-                    status=status.HTTP_204_NO_CONTENT
-                )
+        if remove_counted(model, user=request.user, recipe_id=pk):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, id=pk)
         return Response(
-            {'errors': 'Ошибка запроса'},
+            {'errors': missing_error},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(
+        permission_classes=(IsAuthenticated, ),
+        methods=['POST', 'DELETE'],
+        detail=True,
+    )
+    def favorite(self, request, pk):
+        return self.add_or_remove(
+            request,
+            pk,
+            Favorite,
+            'Рецепт уже в избранном',
+            'Рецепта нет в избранном',
+        )
+
     @action(
         permission_classes=(IsAuthenticated, ),
         methods=['POST', 'DELETE'],
         detail=True,
     )
     def shopping_cart(self, request, pk):
+        return self.add_or_remove(
+            request,
+            pk,
+            ShoppingCart,
+            'Рецепт уже в списке покупок',
+            'Рецепта нет в списке покупок',
+        )
+
+    def bulk_add_or_remove(self, request, model):
+        """Добавление или удаление списка рецептов: одна проверка id через
+        in_bulk и один запрос на запись; статус возвращается по каждому id.
+        """
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        found = Recipe.objects.only('id').in_bulk(recipe_ids)
         if request.method == 'POST':
-            recipe = get_object_or_404(Recipe, id=pk)
-            serializer = FavoriteSerializer(recipe)
-            if not ShoppingCart.objects.filter(
-                    user=request.user, recipe=recipe,).exists():
-                ShoppingCart.objects.create(user=request.user, recipe=recipe,)
-                return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
-            return Response(
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if request.method == 'DELETE':
-            recipe = get_object_or_404(Recipe, id=pk)
-            favorite_for_removre = ShoppingCart.objects.filter(
-                user=request.user,
-                recipe=recipe
-            )
-            if favorite_for_removre.exists():
-                favorite_for_removre.delete()
+            try:
+                with transaction.atomic():
+                    changed = add_counted_many(model, [
+                        {'user': request.user, 'recipe_id': recipe_id}
+                        for recipe_id in found
+                    ])
+            except IntegrityError:
                 return Response(
-                    {'detail': 'Рецепт успешно удален'},
-                    status=status.HTTP_204_NO_CONTENT
+                    {'errors': 'Рецепт удалён во время запроса, повторите'},
+                    status=status.HTTP_404_NOT_FOUND,
                 )
-        return Response(
-            {'errors': 'Ошибка запроса'},
-            status=status.HTTP_400_BAD_REQUEST
+            done, skipped = 'added', 'exists'
+        else:
+            changed = remove_counted_many(
+                model, user=request.user, recipe_id=list(found))
+            done, skipped = 'removed', 'missing'
+        results = []
+        for recipe_id in recipe_ids:
+            if recipe_id not in found:
+                result = 'not_found'
+            elif recipe_id in changed:
+                result = done
+            else:
+                result = skipped
+            results.append({'id': recipe_id, 'status': result})
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(
+        permission_classes=(IsAuthenticated, ),
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='favorite/bulk',
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_add_or_remove(request, Favorite)
+
+    @action(
+        permission_classes=(IsAuthenticated, ),
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='shopping_cart/bulk',
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_add_or_remove(request, ShoppingCart)
+
+    @action(methods=['GET'], detail=False)
+    def can_cook(self, request):
+        """Рецепты из имеющихся ингредиентов: ?ingredients=1&ingredients=2,
+        с missing=N — и те, которым не хватает не больше N ингредиентов.
+        Остальные фильтры списка рецептов тоже работают."""
+        serializer = CanCookSerializer(data={
+            'ingredients': request.query_params.getlist('ingredients'),
+            'missing': request.query_params.get('missing', 0),
+        })
+        serializer.is_valid(raise_exception=True)
+        queryset = cookable(
+            self.filter_queryset(self.get_queryset()),
+            **serializer.validated_data,
         )
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(CookableRecipeSerializer(
+            page, many=True, context=self.get_serializer_context()).data)
 
     @action(
         permission_classes=(IsAuthenticated,),
         methods=['GET'],
         detail=False,
+        renderer_classes=SHOPPING_LIST_RENDERERS,
     )
     def download_shopping_cart(self, request):
-        user = request.user
         ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping__user=user).values(
+            recipe__shopping__user=request.user).values(
             'ingredient__name',
             'ingredient__measurement_unit').order_by(
             'ingredient__name').annotate(
             amount=Sum('amount')
+        ).iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
         )
-        data = []
-        for ingredient in ingredients:
-            data.append(
-                f'{ingredient["ingredient__name"]} - '
-                f'{ingredient["amount"]} '
-                f'{ingredient["ingredient__measurement_unit"]}'
-            )
-        content = 'Список покупок:\n\n' + '\n'.join(data)
-        filename = 'shop.txt'
-        request = HttpResponse(content, content_type='text/plain')
-        request['Content-Disposition'] = f'attachment; filename={filename}'
-        return request
+        response['Content-Disposition'] = (
+            f'attachment; filename=shop.{renderer.format}')
+        return response
@@ -0,0 +1,80 @@
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.core.handlers.asgi import ASGIHandler
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+)
+from users.models import User
+
+
+@override_settings(ROOT_URLCONF='foodgram.asgi_urls')
+class AsgiUrlsTest(TransactionTestCase):
+    """Запросы через ASGI-приложение с маршрутами foodgram.asgi_urls.
+
+    Асинхронные представления работают в пуле потоков со своими
+    соединениями с базой, поэтому нужен TransactionTestCase.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='cook', email='cook@foodgram.ru',
+            first_name='Имя', last_name='Фамилия', password='pass-1234')
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Блины', text='Текст', cooking_time=10,
+            image='recipes/media/recipe.png')
+        for number in range(3):
+            IngredientInRecipe.objects.create(
+                recipe=self.recipe,
+                ingredient=Ingredient.objects.create(
+                    name=f'Ингредиент {number}', measurement_unit='г'),
+                amount=number + 1,
+            )
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+
+    @async_to_sync
+    async def get(self, path, query_string=''):
+        communicator = ApplicationCommunicator(ASGIHandler(), {
+            'type': 'http',
+            'http_version': '1.1',
+            'method': 'GET',
+            'path': path,
+            'query_string': query_string.encode(),
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Token {self.token.key}'.encode()),
+            ],
+        })
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(timeout=10)
+        body = b''
+        while True:
+            message = await communicator.receive_output(timeout=10)
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return start['status'], body.decode()
+
+    def test_detail_route_does_not_shadow_actions(self):
+        status, _ = self.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(status, 200)
+        status, body = self.get(
+            '/api/recipes/can_cook/',
+            f'ingredients={self.recipe.ingredients.first().pk}&missing=2',
+        )
+        self.assertEqual(status, 200, body)
+
+    def test_download_shopping_cart(self):
+        status, body = self.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, (
+            'Список покупок:\n'
+            '\nИнгредиент 0 - 1 г'
+            '\nИнгредиент 1 - 2 г'
+            '\nИнгредиент 2 - 3 г'
+        ))
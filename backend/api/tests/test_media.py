@@ -0,0 +1,97 @@
+import io
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from recipes.management.commands.gc_media import Command
+from recipes.media import change_references
+from recipes.models import MediaBlob, Recipe
+
+GRACE = 60
+
+
+class GcMediaTest(TransactionTestCase):
+    """gc_media не удаляет файлы, на которые ссылаются или которые
+    загружают повторно, в том числе во время его работы."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def upload(self):
+        return self.storage.save(
+            'recipes/media/recipe.png', ContentFile(b'image'))
+
+    def age(self, name):
+        """Файл и запись старше GRACE секунд."""
+        old = timezone.now() - timedelta(seconds=GRACE * 2)
+        MediaBlob.objects.filter(name=name).update(updated=old)
+        os.utime(self.storage.path(name), (old.timestamp(), ) * 2)
+
+    def collect(self):
+        call_command('gc_media', grace=GRACE, stdout=io.StringIO())
+
+    def test_orphan(self):
+        name = self.upload()
+        self.age(name)
+        self.collect()
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_referenced(self):
+        name = self.upload()
+        change_references([name], 1)
+        self.age(name)
+        self.collect()
+        self.assertTrue(self.storage.exists(name))
+
+    def test_reupload(self):
+        name = self.upload()
+        self.age(name)
+        self.assertEqual(self.upload(), name)
+        self.collect()
+        self.assertTrue(self.storage.exists(name))
+
+    def test_reupload_during_collection(self):
+        """Повторная загрузка между проверкой времени файла и его
+        удалением ждёт gc_media и записывает файл заново."""
+        name = self.upload()
+        self.age(name)
+        checked = threading.Event()
+        is_recent = Command.is_recent
+
+        def slow_is_recent(command, name):
+            recent = is_recent(command, name)
+            checked.set()
+            time.sleep(0.5)
+            return recent
+
+        def collect():
+            try:
+                self.collect()
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(
+                Command, 'is_recent', autospec=True,
+                side_effect=slow_is_recent):
+            collector = threading.Thread(target=collect)
+            collector.start()
+            self.assertTrue(checked.wait(5))
+            self.upload()
+            collector.join()
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(MediaBlob.objects.filter(name=name).exists())
@@ -0,0 +1,54 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.pagination import CachedCountPagination
+from users.models import User
+
+
+class CachedCountPaginationTest(TestCase):
+    """Устаревшее количество из кеша не прячет существующие страницы."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.create_users(range(3))
+
+    def create_users(self, numbers):
+        for number in numbers:
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@foodgram.ru',
+                first_name='Имя', last_name='Фамилия', password='pass-1234')
+
+    def test_pages_beyond_cached_count(self):
+        self.assertEqual(
+            self.client.get('/api/users/?limit=2').data['count'], 3)
+        self.create_users(range(3, 7))
+        response = self.client.get('/api/users/?limit=2&page=2')
+        self.assertEqual(response.data['count'], 3)
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get('/api/users/?limit=2&page=4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(
+            self.client.get('/api/users/?limit=2&page=5').status_code, 404)
+
+    def test_approximate_flag(self):
+        response = self.client.get('/api/users/?limit=2')
+        self.assertEqual(response.data['count'], 3)
+        self.assertIs(response.data['count_is_approximate'], False)
+        self.create_users(range(3, 5))
+        response = self.client.get('/api/users/?limit=2')
+        self.assertEqual(response.data['count'], 3)
+        self.assertIs(response.data['count_is_approximate'], True)
+
+    def test_estimated_count(self):
+        with mock.patch.object(
+                CachedCountPagination, 'get_estimated_count',
+                return_value=100000):
+            response = self.client.get('/api/users/?limit=2')
+        self.assertEqual(response.data['count'], 100000)
+        self.assertIs(response.data['count_is_approximate'], True)
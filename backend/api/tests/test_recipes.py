@@ -0,0 +1,639 @@
+import base64
+import io
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.recipes.fiters import get_tag_ids
+from api.recipes.serializers import CreateRecipeSerializer
+from foodgram.constants import MAX_BULK_RECIPES, MAX_MISSING_INGREDIENTS
+from recipes.autocomplete import ingredient_index
+from recipes.counters import add_counted
+from recipes.matching import update_ingredient_ids
+from recipes.media import change_references
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    MediaBlob,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.search import update_search_vectors
+from users.models import Follow, User
+
+
+def png_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+def create_user(username, **kwargs):
+    return User.objects.create_user(
+        username=username, email=f'{username}@foodgram.ru',
+        first_name='Имя', last_name='Фамилия', password='pass-1234',
+        **kwargs)
+
+
+def create_recipe(author, name, text='Текст', tags=(), ingredients=()):
+    """Рецепт в обход API, без загрузки изображения; поиск и подбор по
+    ингредиентам обновляются, как в CreateRecipeSerializer."""
+    recipe = Recipe.objects.create(
+        author=author, name=name, text=text, cooking_time=10,
+        image='recipes/media/recipe.png')
+    recipe.tags.set(tags)
+    IngredientInRecipe.objects.bulk_create(
+        IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+        for ingredient in ingredients
+    )
+    update_search_vectors([recipe.pk])
+    update_ingredient_ids([recipe.pk])
+    return recipe
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов к базе для страницы рецептов не зависит от её
+    размера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Автор', last_name='Рецептов', password='pass-1234')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru',
+            first_name='Читатель', last_name='Рецептов', password='pass-1234')
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(3)
+        ]
+        for number in range(10):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=number + 1, image='recipes/media/recipe.png')
+            recipe.tags.set(tags)
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1)
+                for ingredient in ingredients
+            )
+
+    def assert_page_queries(self, client, queries):
+        for limit in (3, 10):
+            # Представления рецептов кешируются, считаем запросы без кеша
+            cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(queries):
+                response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_page_queries(APIClient(), 5)
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        self.assert_page_queries(client, 6)
+
+    @override_settings(RECIPE_CACHE=True)
+    def test_cached_page(self):
+        """Из кеша берутся количество, теги, ингредиенты и автор:
+        остаётся один запрос рецептов страницы."""
+        cache.clear()
+        client = APIClient()
+        client.get('/api/recipes/?limit=10')
+        with self.assertNumQueries(1):
+            client.get('/api/recipes/?limit=10')
+
+
+class CreateRecipeValidationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Автор', last_name='Рецептов', password='pass-1234')
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+
+    def create_recipe(self, amount):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            return client.post('/api/recipes/', {
+                'name': 'Блины',
+                'text': 'Текст',
+                'cooking_time': 10,
+                'image': png_image(),
+                'tags': [self.tag.pk],
+                'ingredients': [{'id': self.ingredient.pk, 'amount': amount}],
+            }, format='json')
+
+    def test_amount_out_of_range(self):
+        """Количество вне smallint отклоняется валидацией, а не базой."""
+        for amount in (0, 32768):
+            with self.subTest(amount=amount):
+                response = self.create_recipe(amount)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(response.data), ['ingredients'])
+
+    def test_amount_limit(self):
+        response = self.create_recipe(32767)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['ingredients'][0]['amount'], 32767)
+
+
+class RecipeUpdateTest(TestCase):
+    """Изменение рецепта, загруженного до добавления в избранное или до
+    обработки изображения, не затирает счётчики и варианты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Автор', last_name='Рецептов', password='pass-1234')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru',
+            first_name='Читатель', last_name='Рецептов', password='pass-1234')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Блины', text='Текст', cooking_time=10,
+            image='recipes/media/recipe.png')
+
+    def test_stale_instance_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        add_counted(Favorite, user=self.reader, recipe=self.recipe)
+        add_counted(ShoppingCart, user=self.reader, recipe=self.recipe)
+        serializer = CreateRecipeSerializer(
+            recipe, data={'name': 'Оладьи'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.name, 'Оладьи')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.shopping_carts_count, 1)
+
+    def process_image(self, variants):
+        """Как process_image: сохраняет варианты и ссылки на них."""
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image_variants=variants, image_placeholder='L00000fQfQfQ')
+        change_references([variants['thumbnail']['webp']], 1)
+
+    def update(self, recipe, data):
+        serializer = CreateRecipeSerializer(recipe, data=data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Recipe.objects.get(pk=recipe.pk)
+
+    def test_stale_instance_keeps_variants(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        variants = {'thumbnail': {'webp': 'recipes/variants/a.webp'}}
+        self.process_image(variants)
+        recipe = self.update(recipe, {'name': 'Оладьи'})
+        self.assertEqual(recipe.image_variants, variants)
+        self.assertEqual(recipe.image_placeholder, 'L00000fQfQfQ')
+
+    def test_new_image_releases_stored_variants(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.process_image({'thumbnail': {'webp': 'recipes/variants/b.webp'}})
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            recipe = self.update(recipe, {'image': png_image()})
+        self.assertEqual(recipe.image_variants, {})
+        self.assertEqual(MediaBlob.objects.get(
+            name='recipes/variants/b.webp').refcount, 0)
+
+
+class IngredientCreateTest(TestCase):
+
+    def test_duplicate(self):
+        """Повторный ингредиент отклоняется валидацией, а не
+        ограничением unique_ingredient в базе."""
+        Ingredient.objects.create(name='Мука', measurement_unit='г')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(
+            username='admin', email='admin@foodgram.ru', first_name='Имя',
+            last_name='Фамилия', password='pass-1234', is_staff=True))
+        response = client.post(
+            '/api/ingredients/', {'name': 'Мука', 'measurement_unit': 'г'})
+        self.assertEqual(response.status_code, 400)
+        response = client.post(
+            '/api/ingredients/', {'name': 'Мука', 'measurement_unit': 'кг'})
+        self.assertEqual(response.status_code, 201)
+
+
+class IngredientSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Мёд', 'Медовик', 'Свёкла', 'Сок свекольный', 'Соль'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/ingredients/', {'name': query})
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_then_substring(self):
+        self.assertEqual(self.search('мед'), ['Мёд', 'Медовик'])
+        self.assertEqual(self.search('свек'), ['Свёкла', 'Сок свекольный'])
+
+    def test_zero_limit_is_no_limit(self):
+        response = self.client.get('/api/ingredients/', {'limit': 0})
+        self.assertEqual(len(response.json()), 5)
+
+    @override_settings(INGREDIENT_TRIGRAM_SEARCH=True)
+    def test_database_substring_search_folds_yo(self):
+        """Поиск подстроки в базе сворачивает ё так же, как в памяти."""
+        with mock.patch.object(
+                ingredient_index, 'use_trigram_index', return_value=True):
+            self.assertEqual(self.search('ёкл'), ['Свёкла'])
+            self.assertEqual(self.search('вёк'), ['Свёкла', 'Сок свекольный'])
+
+
+class ReferenceCacheTest(TestCase):
+    """Кеш тегов и ингредиентов сбрасывается только после фиксации
+    изменений."""
+
+    def setUp(self):
+        cache.clear()
+        self.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+
+    def names(self):
+        return [
+            ingredient['name']
+            for ingredient in self.client.get('/api/ingredients/').json()
+        ]
+
+    def test_ingredients(self):
+        self.assertEqual(self.names(), ['Мука'])
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.ingredient.name = 'Мука пшеничная'
+                self.ingredient.save()
+            self.assertEqual(self.names(), ['Мука'])
+        self.assertEqual(self.names(), ['Мука пшеничная'])
+
+    def test_tag_ids(self):
+        self.assertEqual(get_tag_ids(), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(
+                name='Обед', color='#49B64E', slug='lunch')
+            self.assertEqual(get_tag_ids(), {})
+        self.assertEqual(get_tag_ids(), {'lunch': tag.pk})
+
+
+class RecipeCursorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.recipes = [
+            create_recipe(author, f'Рецепт {number}') for number in range(5)]
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_pages(self):
+        expected = [recipe.pk for recipe in reversed(self.recipes)]
+        self.assertEqual(self.walk('/api/recipes/?cursor=&limit=2'), expected)
+
+    def test_same_pub_date(self):
+        """Рецепты с одной датой различаются по id и не теряются на
+        границе страниц."""
+        Recipe.objects.update(pub_date=self.recipes[0].pub_date)
+        expected = [recipe.pk for recipe in reversed(self.recipes)]
+        self.assertEqual(self.walk('/api/recipes/?cursor=&limit=2'), expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=bad')
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeTagFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        breakfast, lunch, dinner = (
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+                ('Ужин', '#8775D2', 'dinner'),
+            )
+        )
+        cls.both = create_recipe(author, 'Омлет', tags=[breakfast, lunch])
+        cls.lunch = create_recipe(author, 'Суп', tags=[lunch])
+        cls.dinner = create_recipe(author, 'Рагу', tags=[dinner])
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_any(self):
+        self.assertEqual(
+            self.ids('tags=breakfast&tags=lunch'),
+            {self.both.pk, self.lunch.pk},
+        )
+        self.assertEqual(
+            self.ids('tags=breakfast&tags=lunch&tags_mode=any'),
+            {self.both.pk, self.lunch.pk},
+        )
+
+    def test_all(self):
+        self.assertEqual(
+            self.ids('tags=breakfast&tags=lunch&tags_mode=all'),
+            {self.both.pk},
+        )
+        self.assertEqual(
+            self.ids('tags=lunch&tags_mode=all'),
+            {self.both.pk, self.lunch.pk},
+        )
+
+    def test_invalid(self):
+        for query in ('tags=brunch', 'tags=lunch&tags_mode=some'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/?{query}')
+                self.assertEqual(response.status_code, 400)
+
+
+class CounterSignalsTest(TestCase):
+    """Счётчики не расходятся при удалении через админку и каскадом."""
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        self.recipes = [
+            create_recipe(self.author, 'Блины'),
+            create_recipe(self.author, 'Оладьи'),
+        ]
+        add_counted(Favorite, user=self.reader, recipe=self.recipes[0])
+        add_counted(Follow, user=self.reader, author=self.author)
+
+    def test_create(self):
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+    def test_api_delete(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.delete(f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+
+    def test_admin_delete(self):
+        admin = create_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.post(
+            f'/admin/recipes/recipe/{self.recipes[0].pk}/delete/',
+            {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+
+    def test_user_delete(self):
+        self.reader.delete()
+        self.author.refresh_from_db()
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+        self.assertEqual(self.recipes[0].favorites_count, 0)
+
+
+class RecipeScoreOrderingTest(TestCase):
+    """popular сортирует по числу добавлений, trending — по свежим."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        readers = [create_user(f'reader{number}') for number in range(2)]
+        cls.old = create_recipe(author, 'Старый хит')
+        cls.fresh = create_recipe(author, 'Новинка')
+        cls.quiet = create_recipe(author, 'Без добавлений')
+        for reader in readers:
+            add_counted(Favorite, user=reader, recipe=cls.old)
+        add_counted(ShoppingCart, user=readers[0], recipe=cls.fresh)
+        Favorite.objects.filter(recipe=cls.old).update(
+            created=timezone.now() - timedelta(days=30))
+        call_command('refresh_scores', stdout=io.StringIO())
+
+    def ordered(self, ordering):
+        response = self.client.get(
+            '/api/recipes/', {'ordering': ordering, 'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_popular(self):
+        self.assertEqual(
+            self.ordered('popular'),
+            [self.old.pk, self.fresh.pk, self.quiet.pk])
+
+    def test_trending(self):
+        self.assertEqual(
+            self.ordered('trending'),
+            [self.fresh.pk, self.old.pk, self.quiet.pk])
+
+    def test_invalid(self):
+        response = self.client.get('/api/recipes/', {'ordering': 'random'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkRecipesTest(TestCase):
+    """Добавление и удаление списка рецептов в избранное."""
+
+    url = '/api/recipes/favorite/bulk/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.recipes = [
+            create_recipe(cls.author, f'Рецепт {number}')
+            for number in range(3)
+        ]
+        add_counted(Favorite, user=cls.reader, recipe=cls.recipes[0])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def counts(self):
+        return [
+            Recipe.objects.get(pk=recipe.pk).favorites_count
+            for recipe in self.recipes
+        ]
+
+    def test_add_partial_duplicates(self):
+        first, second, third = [recipe.pk for recipe in self.recipes]
+        missing = third + 100
+        response = self.client.post(
+            self.url,
+            {'recipes': [second, first, missing, second]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'id': second, 'status': 'added'},
+            {'id': first, 'status': 'exists'},
+            {'id': missing, 'status': 'not_found'},
+        ])
+        self.assertEqual(self.counts(), [1, 1, 0])
+
+    def test_remove(self):
+        first, second, _ = [recipe.pk for recipe in self.recipes]
+        response = self.client.delete(
+            self.url, {'recipes': [first, second]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'id': first, 'status': 'removed'},
+            {'id': second, 'status': 'missing'},
+        ])
+        self.assertEqual(self.counts(), [0, 0, 0])
+
+    def test_limit(self):
+        ids = [self.recipes[1].pk] * MAX_BULK_RECIPES
+        response = self.client.post(self.url, {'recipes': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            self.url, {'recipes': ids + [ids[0]]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('recipes', response.data)
+
+    def test_recipe_deleted_during_request(self):
+        """Внешние ключи отложенные и проверяются при COMMIT; в тесте
+        транзакция не завершается, поэтому проверка включается сразу."""
+        deleted = self.recipes[2].pk + 100
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        with mock.patch(
+            'django.db.models.query.QuerySet.in_bulk',
+            return_value={self.recipes[1].pk: None, deleted: None},
+        ):
+            response = self.client.post(
+                self.url, {'recipes': [self.recipes[1].pk]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.counts(), [1, 0, 0])
+
+
+class RecipeSearchTest(TestCase):
+    """Совпадение в названии важнее совпадения в ингредиентах, а оно —
+    важнее совпадения в описании."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        chicken = Ingredient.objects.create(
+            name='Курица', measurement_unit='г')
+        rice = Ingredient.objects.create(name='Рис', measurement_unit='г')
+        # Созданы в обратном порядке, чтобы не совпасть с -pub_date
+        cls.by_name = create_recipe(author, 'Курица в духовке')
+        cls.by_ingredient = create_recipe(
+            author, 'Плов', ingredients=(chicken, rice))
+        cls.by_text = create_recipe(
+            author, 'Салат', text='Можно добавить курицу.')
+        create_recipe(author, 'Блины', ingredients=(rice, ))
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_ranking(self):
+        self.assertEqual(self.search('курица'), [
+            self.by_name.pk, self.by_ingredient.pk, self.by_text.pk])
+
+    def test_websearch_syntax(self):
+        self.assertCountEqual(
+            self.search('курица -плов'), [self.by_name.pk, self.by_text.pk])
+
+    def test_no_matches(self):
+        self.assertEqual(self.search('шоколад'), [])
+
+
+class CanCookTest(TestCase):
+    """Подбор рецептов по имеющимся ингредиентам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        flour, milk, eggs, sugar = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Молоко', 'Яйца', 'Сахар')
+        ]
+        cls.pantry = (flour.pk, milk.pk)
+        # Созданы в обратном порядке, чтобы не совпасть с -pub_date
+        cls.ready = create_recipe(
+            author, 'Лепёшки', ingredients=(flour, milk))
+        cls.one_missing = create_recipe(
+            author, 'Блины', ingredients=(flour, milk, eggs))
+        cls.two_missing = create_recipe(
+            author, 'Омлет', ingredients=(milk, eggs, sugar))
+        create_recipe(author, 'Безе', ingredients=(eggs, sugar))
+
+    def can_cook(self, **params):
+        return self.client.get(
+            '/api/recipes/can_cook/', {'ingredients': self.pantry, **params})
+
+    def found(self, **params):
+        response = self.can_cook(**params)
+        self.assertEqual(response.status_code, 200)
+        return [
+            (recipe['id'], recipe['missing_ingredients'])
+            for recipe in response.data['results']
+        ]
+
+    def test_all_ingredients(self):
+        self.assertEqual(self.found(), [(self.ready.pk, 0)])
+
+    def test_missing(self):
+        self.assertEqual(self.found(missing=1), [
+            (self.ready.pk, 0), (self.one_missing.pk, 1)])
+        self.assertEqual(self.found(missing=2), [
+            (self.ready.pk, 0),
+            (self.one_missing.pk, 1),
+            (self.two_missing.pk, 2),
+        ])
+
+    def test_invalid(self):
+        self.assertEqual(self.can_cook(missing=-1).status_code, 400)
+        self.assertEqual(self.can_cook(
+            missing=MAX_MISSING_INGREDIENTS + 1).status_code, 400)
+        response = self.client.get('/api/recipes/can_cook/')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+class ConcurrentTogglesTest(TransactionTestCase):
+    """Одновременные добавления и удаления из избранного, списка покупок
+    и подписок не дают ошибок 5xx, а счётчики совпадают с числом связей."""
+
+    def setUp(self):
+        self.author = self.create_user('author')
+        self.readers = [self.create_user(f'reader{number}')
+                        for number in range(4)]
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Блины', text='Текст', cooking_time=10,
+            image='recipes/media/recipe.png')
+
+    def create_user(self, username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@foodgram.ru',
+            first_name='Имя', last_name='Фамилия', password='pass-1234')
+
+    def request(self, job):
+        user, method, url, *data = job
+        client = APIClient()
+        client.force_authenticate(user)
+        try:
+            return getattr(client, method)(
+                url, *data, format='json').status_code
+        finally:
+            connections.close_all()
+
+    def test_toggles(self):
+        urls = (
+            f'/api/recipes/{self.recipe.pk}/favorite/',
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+            f'/api/users/{self.author.pk}/subscribe/',
+        )
+        jobs = [
+            (reader, 'post' if number % 3 else 'delete', url)
+            for number in range(50)
+            for reader in self.readers
+            for url in urls
+        ]
+        with ThreadPoolExecutor(16) as executor:
+            codes = list(executor.map(self.request, jobs))
+        self.assertFalse([code for code in codes if code >= 500])
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(
+            self.recipe.favorites_count,
+            Favorite.objects.filter(recipe=self.recipe).count(),
+        )
+        self.assertEqual(
+            self.recipe.shopping_carts_count,
+            ShoppingCart.objects.filter(recipe=self.recipe).count(),
+        )
+        self.assertEqual(
+            self.author.followers_count,
+            Follow.objects.filter(author=self.author).count(),
+        )
+
+    def test_bulk_toggles(self):
+        """Пересекающиеся списки в разном порядке не дают deadlock."""
+        recipes = [self.recipe] + [
+            Recipe.objects.create(
+                author=self.author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image='recipes/media/recipe.png')
+            for number in range(4)
+        ]
+        ids = [recipe.pk for recipe in recipes]
+        lists = (ids, ids[::-1], ids[1:], ids[:-1][::-1], ids[::2])
+        jobs = [
+            (
+                reader,
+                'post' if number % 3 else 'delete',
+                '/api/recipes/favorite/bulk/',
+                {'recipes': lists[(number + index) % len(lists)]},
+            )
+            for number in range(30)
+            for index, reader in enumerate(self.readers)
+        ]
+        with ThreadPoolExecutor(16) as executor:
+            codes = list(executor.map(self.request, jobs))
+        self.assertEqual(set(codes), {200})
+        for recipe in recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(
+                recipe.favorites_count,
+                Favorite.objects.filter(recipe=recipe).count(),
+            )
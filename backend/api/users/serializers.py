@@ -22,6 +22,9 @@ class FoodgramUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, data):
+        followed_authors = self.context.get('followed_authors')
+        if followed_authors is not None:
+            return data.id in followed_authors
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -1,3 +1,5 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -5,19 +7,50 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from api.pagination import FoodgramPagination
+from api.mixins import FollowedAuthorsMixin
+from api.pagination import CachedCountPagination
 from api.recipes.serializers import FollowUserSerializer
+from recipes.counters import add_counted, remove_counted
+from recipes.models import Recipe
 from users.models import Follow, User
 
 from .serializers import FoodgramUserSerializer
 
 
-class FoodgramUsersViewSet(UserViewSet):
+class FoodgramUsersViewSet(FollowedAuthorsMixin, UserViewSet):
 
     queryset = User.objects.all()
     serializer_class = FoodgramUserSerializer
     permission_classes = (AllowAny, )
-    pagination_class = FoodgramPagination
+    pagination_class = CachedCountPagination
+
+    def get_recipes_limit(self):
+        limit = self.request.query_params.get('recipes_limit', '')
+        return int(limit) if limit.isdigit() else 0
+
+    def attach_recipes(self, authors):
+        """Рецепты всех авторов страницы одним запросом."""
+        recipes = Recipe.objects.filter(author__in=authors).order_by(
+            '-pub_date', '-id')
+        limit = self.get_recipes_limit()
+        if limit:
+            recipes = recipes.annotate(row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            ))
+            sql, params = recipes.query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) AS ranked '
+                'WHERE row_number <= %s ORDER BY pub_date DESC, id DESC',
+                (*params, limit),
+            )
+        recipes_by_author = {author.id: [] for author in authors}
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.limited_recipes = recipes_by_author[author.id]
+        return authors
 
     @action(
         permission_classes=(IsAuthenticated,),
@@ -26,33 +59,34 @@ class FoodgramUsersViewSet(UserViewSet):
         detail=True,
     )
     def subscribe(self, request, id):
-        author = get_object_or_404(User, id=id)
         user = request.user
         if request.method == 'POST':
+            author = get_object_or_404(User, id=id)
             if author == user:
                 return Response(
                     {'errors': 'Нельзя подписаться на себя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            set_follow = Follow(user=user, author=author)
-            set_follow.save()
+            if not add_counted(Follow, user=user, author=author):
+                return Response(
+                    {'errors': 'Вы уже подписаны на этого автора'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             serializer = FollowUserSerializer(
-                author, context={'request': request},)
+                self.attach_recipes([author])[0],
+                context=self.get_serializer_context(),
+            )
             return Response(
                 serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            author = get_object_or_404(User, id=id)
-            user = request.user
-            unfollowing = get_object_or_404(
-                Follow,
-                user=user,
-                author=author
-            )
-            unfollowing.delete()
+        if remove_counted(Follow, user=user, author_id=id):
             return Response(
                 status=status.HTTP_204_NO_CONTENT
             )
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        get_object_or_404(User, id=id)
+        return Response(
+            {'errors': 'Вы не подписаны на этого автора'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
     @action(
         permission_classes=(IsAuthenticated,),
@@ -63,11 +97,11 @@ class FoodgramUsersViewSet(UserViewSet):
     def subscriptions(self, request):
         queryset = User.objects.filter(
             following__user=request.user
-        )
+        ).order_by('username')
         page = self.paginate_queryset(queryset)
         serializer = FollowUserSerializer(
-            page,
+            self.attach_recipes(page),
             many=True,
-            context={'request': request}
+            context=self.get_serializer_context()
         )
         return self.get_paginated_response(serializer.data)
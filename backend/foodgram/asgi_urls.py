@@ -0,0 +1,4 @@
+from api.async_views import async_patterns
+from foodgram.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = async_patterns(sync_urlpatterns)
@@ -0,0 +1,36 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def version_key(model):
+    return f'version:{model._meta.label_lower}'
+
+
+def get_version(model):
+    """Текущая версия данных модели.
+
+    Начальное значение берется из времени, чтобы после вытеснения ключа
+    из кеша новая версия не совпала ни с одной из прежних.
+    """
+    key = version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(model):
+    key = version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_version_on_commit(model):
+    """Меняет версию после фиксации транзакции: иначе параллельный запрос
+    успел бы сохранить в кеш старые строки уже под новой версией."""
+    transaction.on_commit(lambda: bump_version(model))
@@ -3,11 +3,63 @@ LENGTH_VALUE_FOR_RECIPE = 200
 LENGTH_VALUE_FOR_COLOR = 7
 MIN_VALUE_FOR_RECIPE = 1
 MAX_VALUE_FOR_RECIPE = 360
+MAX_MISSING_INGREDIENTS = 5
+IMAGE_PLACEHOLDER_LENGTH = 200
+MEDIA_NAME_LENGTH = 255
 
 # Используются в users.models
 LENGTH_VALUE_FOR_USER = 150
 LENGTH_VALUE_FOR_EMAIL = 254
 MIN_VALUE = 3
 
+# Используются в recipes.autocomplete
+INGREDIENT_INDEX_TTL = 300
+
+# Используются в api.mixins
+REFERENCE_CACHE_TIMEOUT = 60 * 60
+
+# Используются в api.fields
+MAX_IMAGE_UPLOAD_SIZE = 20 * 1024 * 1024
+MAX_IMAGE_PIXELS = 50_000_000
+BASE64_CHUNK_SIZE = 64 * 1024
+
 # Используются в api.pagination
 PAGE_SIZE = 6
+COUNT_CACHE_TIMEOUT = 30
+
+# Используются в api.recipes.views
+SHOPPING_LIST_CHUNK_SIZE = 2000
+
+# Используются в api.recipes.serializers
+MAX_BULK_RECIPES = 100
+MAX_PANTRY_INGREDIENTS = 200
+MAX_INGREDIENT_AMOUNT = 32767
+RECIPE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Используются в recipes.scores
+TRENDING_HALF_LIFE = 3 * 24 * 60 * 60
+SCORE_REFRESH_OVERLAP = 60
+SCORE_REFRESH_BATCH_SIZE = 1000
+
+# Используются в recipes.management.commands.import
+IMPORT_BATCH_SIZE = 5000
+IMPORT_READ_SIZE = 64 * 1024
+
+# Используются в recipes.management.commands.gc_media
+MEDIA_GC_BATCH_SIZE = 500
+# Сколько секунд файл без ссылок не удаляется: за это время на него
+# может сослаться запрос, который ещё не зафиксировал транзакцию
+MEDIA_GC_GRACE = 60 * 60
+
+# Используются в recipes.images
+# Варианты изображения рецепта и их наибольшая сторона в пикселях,
+# от большего к меньшему: каждый следующий уменьшается из предыдущего
+IMAGE_VARIANTS = {
+    'full': 1280,
+    'card': 640,
+    'thumbnail': 160,
+}
+IMAGE_FORMATS = ('webp', 'jpeg')
+IMAGE_QUALITY = 80
+IMAGE_PLACEHOLDER_SIZE = 32
+IMAGE_PLACEHOLDER_COMPONENTS = (4, 3)
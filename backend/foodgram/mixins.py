@@ -0,0 +1,17 @@
+class PreservedFieldsMixin:
+    """save() уже существующего объекта не перезаписывает поля из
+    preserved_fields: их меняют только запросы UPDATE, и значение,
+    прочитанное до такого запроса, затёрло бы его результат."""
+
+    preserved_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = {*self.preserved_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in skipped
+                and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'users.apps.UsersConfig',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
@@ -57,7 +58,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'foodgram.urls'
+# foodgram.asgi sets ROOT_URLCONF=foodgram.asgi_urls: the same URLs with
+# the hot read endpoints served by async views
+
+ROOT_URLCONF = os.getenv('ROOT_URLCONF', 'foodgram.urls')
 
 TEMPLATES = [
     {
@@ -90,6 +94,31 @@ DATABASES = {
     }
 }
 
+# Cache: Redis if REDIS_URL is set, local memory otherwise
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'foodgram',
+        }
+    }
+
+# Cache recipe representations. In local memory an edit would drop them only
+# in the worker that made it, so this is on by default only with Redis;
+# RECIPE_CACHE=True also suits a single worker
+
+RECIPE_CACHE = os.getenv(
+    'RECIPE_CACHE', str(bool(os.getenv('REDIS_URL')))
+) == 'True'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -132,6 +161,24 @@ MEDIA_ROOT = '/media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Ingredient substring search through the pg_trgm GIN index
+
+INGREDIENT_TRIGRAM_SEARCH = os.getenv('INGREDIENT_TRIGRAM_SEARCH', 'False') == 'True'
+
+# Unfiltered lists larger than this report the planner's row estimate as count
+
+APPROXIMATE_COUNT_THRESHOLD = int(os.getenv('APPROXIMATE_COUNT_THRESHOLD', 100000))
+
+# Processes per web worker that resize uploaded recipe images; 0 resizes
+# right after commit inside the request
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 1))
+
+# Threads per ASGI worker that run async views; each holds at most one
+# database connection
+
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', 10))
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -141,7 +188,7 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'api.pagination.FoodgramPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CachedCountPagination',
 }
 
 DJOSER = {
@@ -1,6 +1,9 @@
 from django.contrib import admin
 
+from .images import image_uploaded
+from .matching import update_ingredient_ids
 from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from .search import update_search_vectors
 
 
 @admin.register(Tag)
@@ -43,6 +46,8 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'text',
         'pub_date',
+        'favorites_count',
+        'shopping_carts_count',
     )
     search_fields = (
         'author',
@@ -50,6 +55,19 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     inlines = [IngredientsInLine, TagInLine]
 
+    def save_model(self, request, obj, form, change):
+        if 'image' not in form.changed_data:
+            return super().save_model(request, obj, form, change)
+        old_image = Recipe.objects.filter(pk=obj.pk).values_list(
+            'image', flat=True).first()
+        super().save_model(request, obj, form, change)
+        image_uploaded(obj, old_image)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_vectors([form.instance.pk])
+        update_ingredient_ids([form.instance.pk])
+
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
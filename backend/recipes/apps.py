@@ -6,3 +6,6 @@ class RecipesConfig(AppConfig):
     name = 'recipes'
     verbose_name = 'Рецепты'
     verbose_name_plural = 'Рецепты'
+
+    def ready(self):
+        import recipes.signals  # noqa: F401
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Lower, Replace
+
+from foodgram.cache import get_version
+from foodgram.constants import INGREDIENT_INDEX_TTL
+from recipes.models import Ingredient
+
+logger = logging.getLogger(__name__)
+
+WORD_MATCH, SUBSTRING_MATCH = range(2)
+# Создаётся миграцией 0003, если на сервере есть pg_trgm
+TRIGRAM_INDEX = 'recipes_ingredient_name_trgm'
+
+
+def fold(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def fold_expression(field):
+    """fold() в SQL; совпадает с выражением индекса TRIGRAM_INDEX."""
+    return Replace(Lower(field), Value('ё'), Value('е'))
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Названия хранятся в отсортированном списке, поэтому поиск по началу
+    названия сводится к двум бинарным поискам. Индекс строится при первом
+    обращении и перестраивается, когда сигналы меняют версию ингредиентов
+    в общем кеше, или по истечении ttl.
+    """
+
+    def __init__(self, ttl=INGREDIENT_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._keys = None
+        self._ingredients = None
+        self._version = None
+        self._loaded_at = 0
+        self._trigram_index = None
+
+    def use_trigram_index(self):
+        """Поиск подстроки в базе включён настройкой и возможен, только
+        если миграция смогла создать индекс; иначе поиск идёт в памяти."""
+        if not settings.INGREDIENT_TRIGRAM_SEARCH:
+            return False
+        if self._trigram_index is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT 1 FROM pg_indexes WHERE indexname = %s',
+                    (TRIGRAM_INDEX, ),
+                )
+                self._trigram_index = cursor.fetchone() is not None
+            if not self._trigram_index:
+                logger.warning(
+                    'Нет индекса %s (pg_trgm), ингредиенты ищутся в памяти',
+                    TRIGRAM_INDEX,
+                )
+        return self._trigram_index
+
+    def load(self):
+        rows = Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        ingredients = sorted(
+            (
+                (fold(name), name, pk, measurement_unit)
+                for pk, name, measurement_unit in rows
+            ),
+            key=lambda ingredient: (ingredient[0], ingredient[1]),
+        )
+        return (
+            [ingredient[0] for ingredient in ingredients],
+            [
+                {
+                    'id': pk,
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                }
+                for _, name, pk, measurement_unit in ingredients
+            ],
+        )
+
+    def get_data(self):
+        version = get_version(Ingredient)
+        with self._lock:
+            expired = time.monotonic() - self._loaded_at > self.ttl
+            if self._keys is None or expired or self._version != version:
+                self._keys, self._ingredients = self.load()
+                self._version = version
+                self._loaded_at = time.monotonic()
+            return self._keys, self._ingredients
+
+    def prefix_range(self, keys, query):
+        upper = query[:-1] + chr(ord(query[-1]) + 1)
+        return bisect_left(keys, query), bisect_left(keys, upper)
+
+    def rank(self, query, key):
+        position = key.find(query)
+        if not key[position - 1].isalpha():
+            return WORD_MATCH, key
+        return SUBSTRING_MATCH, position, key
+
+    def substring_matches(self, keys, ingredients, query):
+        if self.use_trigram_index():
+            rows = Ingredient.objects.annotate(
+                folded_name=fold_expression('name'),
+            ).filter(
+                folded_name__contains=query,
+            ).values_list('id', 'name', 'measurement_unit')
+            matches = [
+                (fold(name), {
+                    'id': pk,
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                })
+                for pk, name, measurement_unit in rows
+            ]
+        else:
+            matches = [
+                (key, ingredients[position])
+                for position, key in enumerate(keys)
+                if query in key
+            ]
+        return [
+            ingredient for _, ingredient in sorted(
+                (
+                    (self.rank(query, key), ingredient)
+                    for key, ingredient in matches
+                    if not key.startswith(query)
+                ),
+                key=lambda match: match[0],
+            )
+        ]
+
+    def search(self, query, limit=None):
+        """Сначала совпадения по началу названия, затем по началу слова,
+        затем остальные вхождения; внутри группы — по алфавиту."""
+        keys, ingredients = self.get_data()
+        query = fold(query.strip())
+        if not query:
+            return ingredients[:limit]
+        start, stop = self.prefix_range(keys, query)
+        results = ingredients[start:stop]
+        if limit is not None and len(results) >= limit:
+            return results[:limit]
+        results.extend(
+            self.substring_matches(keys, ingredients, query))
+        return results[:limit]
+
+
+ingredient_index = IngredientIndex()
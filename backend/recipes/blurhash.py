@@ -0,0 +1,87 @@
+"""Кодировщик BlurHash (https://blurha.sh) без внешних зависимостей.
+
+Изображение раскладывается по косинусным базисам в линейном цвете;
+строка из 20–30 символов base83 позволяет клиенту нарисовать размытую
+заглушку, пока загружается картинка.
+"""
+import math
+
+BASE83 = (
+    '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    'abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+)
+
+
+def base83(value, length):
+    return ''.join(
+        BASE83[value // 83 ** (length - position) % 83]
+        for position in range(1, length + 1)
+    )
+
+
+def srgb_to_linear(value):
+    value /= 255
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def linear_to_srgb(value):
+    value = max(0, min(1, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+LINEAR = [srgb_to_linear(value) for value in range(256)]
+
+
+def encode(image, x_components=4, y_components=3):
+    """BlurHash изображения Pillow; image стоит заранее уменьшить до
+    32 пикселей по большей стороне, время растёт с числом пикселей."""
+    image = image.convert('RGB')
+    width, height = image.size
+    pixels = [
+        (LINEAR[red], LINEAR[green], LINEAR[blue])
+        for red, green, blue in image.getdata()
+    ]
+    factors = []
+    for j in range(y_components):
+        rows = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            columns = [
+                math.cos(math.pi * i * x / width) for x in range(width)]
+            red = green = blue = 0.0
+            for y, row in enumerate(rows):
+                offset = y * width
+                for x, column in enumerate(columns):
+                    basis = row * column
+                    pixel = pixels[offset + x]
+                    red += basis * pixel[0]
+                    green += basis * pixel[1]
+                    blue += basis * pixel[2]
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            factors.append((red * scale, green * scale, blue * scale))
+    dc, ac = factors[0], factors[1:]
+    result = base83(x_components - 1 + (y_components - 1) * 9, 1)
+    maximum = 1
+    quantised = 0
+    if ac:
+        actual = max(abs(value) for factor in ac for value in factor)
+        quantised = max(0, min(82, math.floor(actual * 166 - 0.5)))
+        maximum = (quantised + 1) / 166
+    result += base83(quantised, 1)
+    red, green, blue = (linear_to_srgb(value) for value in dc)
+    result += base83((red << 16) + (green << 8) + blue, 4)
+    for factor in ac:
+        red, green, blue = (
+            max(0, min(18, math.floor(
+                sign_pow(value / maximum, 0.5) * 9 + 9.5)))
+            for value in factor
+        )
+        result += base83(red * 19 * 19 + green * 19 + blue, 2)
+    return result
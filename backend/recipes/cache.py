@@ -0,0 +1,28 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from foodgram.cache import get_version
+from recipes.models import Ingredient, Tag
+
+
+def recipe_cache_keys(recipe_ids):
+    """Ключи готовых представлений рецептов.
+
+    В ключ входят версии тегов и ингредиентов: их изменение затрагивает
+    сразу много рецептов, поэтому такие записи не удаляются, а перестают
+    читаться.
+    """
+    versions = f'{get_version(Tag)}:{get_version(Ingredient)}'
+    return {
+        recipe_id: f'recipe:{recipe_id}:{versions}'
+        for recipe_id in recipe_ids
+    }
+
+
+def invalidate_recipes(recipe_ids):
+    """Удаляет представления рецептов после фиксации транзакции, чтобы
+    параллельный запрос не успел сохранить в кеш старые данные."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: cache.delete_many(
+            list(recipe_cache_keys(recipe_ids).values())))
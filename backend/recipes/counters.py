@@ -0,0 +1,185 @@
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# (модель, поле-счётчик, считаемая модель, ссылка на модель)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (User, 'followers_count', Follow, 'author'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно сдвигает счётчик одним UPDATE, не опускаясь ниже нуля."""
+    return model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def change_counted(instance, delta):
+    """Сдвигает счётчик объекта, на который ссылается связь instance.
+
+    Для строк, созданных и удалённых через ORM: в админке, каскадом при
+    удалении пользователя или рецепта. add_counted и remove_counted
+    работают сырым SQL и сигналов не вызывают.
+    """
+    model, field, link = get_counter(type(instance))
+    return change_counter(
+        model, getattr(instance, link.attname), field, delta)
+
+
+def get_counter(counted_model):
+    """Модель со счётчиком, имя поля-счётчика и поле ссылки на неё."""
+    for model, field, counter_model, link in COUNTERS:
+        if counter_model is counted_model:
+            return model, field, counted_model._meta.get_field(link)
+    raise ValueError(f'Для {counted_model.__name__} нет счётчика.')
+
+
+def prepare_value(counted_model, name, value):
+    """Колонка и значение для SQL; value может быть и объектом модели."""
+    field = counted_model._meta.get_field(name)
+    instance = counted_model(**{name: value})
+    return (
+        connection.ops.quote_name(field.column),
+        field.get_db_prep_save(getattr(instance, field.attname), connection),
+    )
+
+
+def update_counter_sql(counted_model, modifying_sql, sign):
+    """UPDATE счётчиков по строкам, которые вернул modifying_sql.
+
+    Строки группируются по ссылке, поэтому счётчик сдвигается на их
+    количество, даже если запрос затронул несколько строк одного объекта.
+    Перед UPDATE строки счётчиков блокируются по возрастанию id: иначе
+    два запроса с пересекающимися списками могут заблокировать их в
+    разном порядке и получить deadlock.
+    """
+    model, field, link = get_counter(counted_model)
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    pk = quote(model._meta.pk.column)
+    counter = quote(field)
+    link = quote(link.column)
+    return (
+        f'WITH changed AS ({modifying_sql} RETURNING {link}), '
+        f'deltas AS (SELECT {link} AS id, COUNT(*) AS delta '
+        f'FROM changed GROUP BY {link}), '
+        f'locked AS (SELECT {pk} AS id FROM {table} '
+        f'WHERE {pk} IN (SELECT id FROM deltas) '
+        f'ORDER BY {pk} FOR NO KEY UPDATE) '
+        f'UPDATE {table} '
+        f'SET {counter} = GREATEST({counter} {sign} deltas.delta, 0) '
+        f'FROM deltas JOIN locked ON locked.id = deltas.id '
+        f'WHERE {table}.{pk} = deltas.id '
+        f'RETURNING {table}.{pk}'
+    )
+
+
+def execute_counted(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def add_counted_many(counted_model, objects):
+    """Добавляет связи и увеличивает их счётчики одним запросом.
+
+    INSERT ... ON CONFLICT DO NOTHING не падает на уже существующих
+    связях, в том числе при гонке параллельных запросов, а счётчики
+    увеличиваются только для действительно добавленных строк. objects —
+    словари значений полей; возвращает id объектов, для которых связь
+    добавлена. Строки вставляются по возрастанию id этих объектов, чтобы
+    параллельные запросы с теми же связями ждали друг друга, а не
+    получали deadlock на уникальном индексе.
+    """
+    if not objects:
+        return set()
+    fields = [
+        field for field in counted_model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    link = get_counter(counted_model)[2].attname
+    instances = sorted(
+        (counted_model(**values) for values in objects),
+        key=lambda instance: getattr(instance, link),
+    )
+    params = []
+    for instance in instances:
+        params.extend(
+            field.get_db_prep_save(
+                field.pre_save(instance, True), connection)
+            for field in fields
+        )
+    quote = connection.ops.quote_name
+    row = f'({", ".join(["%s"] * len(fields))})'
+    sql = (
+        f'INSERT INTO {quote(counted_model._meta.db_table)} '
+        f'({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES {", ".join([row] * len(objects))} '
+        f'ON CONFLICT DO NOTHING'
+    )
+    return execute_counted(update_counter_sql(counted_model, sql, '+'), params)
+
+
+def remove_counted_many(counted_model, **values):
+    """Удаляет связи и уменьшает их счётчики одним запросом
+    (DELETE ... RETURNING). Значение-список превращается в = ANY(...);
+    возвращает id объектов, у которых связь была удалена."""
+    conditions = []
+    params = []
+    for name, value in values.items():
+        if isinstance(value, (list, tuple, set)):
+            prepared = [
+                prepare_value(counted_model, name, item) for item in value]
+            if not prepared:
+                return set()
+            conditions.append(f'{prepared[0][0]} = ANY(%s)')
+            params.append([item for _, item in prepared])
+        else:
+            column, item = prepare_value(counted_model, name, value)
+            conditions.append(f'{column} = %s')
+            params.append(item)
+    sql = (
+        f'DELETE FROM '
+        f'{connection.ops.quote_name(counted_model._meta.db_table)} '
+        f'WHERE {" AND ".join(conditions)}'
+    )
+    return execute_counted(update_counter_sql(counted_model, sql, '-'), params)
+
+
+def add_counted(counted_model, **values):
+    """Добавляет одну связь; True, если её ещё не было."""
+    return bool(add_counted_many(counted_model, [values]))
+
+
+def remove_counted(counted_model, **values):
+    """Удаляет одну связь; True, если она была."""
+    return bool(remove_counted_many(counted_model, **values))
+
+
+def actual_count(counted_model, link):
+    return Coalesce(
+        Subquery(
+            counted_model.objects.filter(
+                **{link: OuterRef('pk')}
+            ).order_by().values(link).annotate(
+                count=Count('pk')).values('count')
+        ),
+        0,
+    )
+
+
+def recount(model, field, counted_model, link):
+    """Пересчитывает счётчик и обновляет только разошедшиеся строки.
+
+    Возвращает количество исправленных строк.
+    """
+    actual = actual_count(counted_model, link)
+    drifted = model.objects.annotate(actual=actual).exclude(
+        **{field: F('actual')}).values('pk')
+    return model.objects.filter(pk__in=drifted).update(**{field: actual})
@@ -0,0 +1,213 @@
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from foodgram.constants import (
+    IMAGE_FORMATS,
+    IMAGE_PLACEHOLDER_COMPONENTS,
+    IMAGE_PLACEHOLDER_SIZE,
+    IMAGE_QUALITY,
+    IMAGE_VARIANTS,
+)
+from recipes import blurhash
+from recipes.media import change_references
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/variants'
+SAVE_OPTIONS = {
+    'webp': {'quality': IMAGE_QUALITY, 'method': 4},
+    'jpeg': {'quality': IMAGE_QUALITY, 'optimize': True, 'progressive': True},
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def open_image(file):
+    """Открывает изображение с учётом поворота из EXIF; JPEG сразу
+    декодируется в уменьшенном масштабе, не меньше самого большого
+    варианта."""
+    image = Image.open(file)
+    largest = max(IMAGE_VARIANTS.values())
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def encode_image(image, image_format):
+    if image_format == 'jpeg' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, image_format.upper(), **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+def render_variants(image, stem, storage):
+    """Сохраняет варианты в хранилище; каждый следующий вариант
+    уменьшается из предыдущего. Возвращает описание вариантов для
+    Recipe.image_variants и заглушку."""
+    variants = {}
+    image = image.copy()
+    for variant, size in IMAGE_VARIANTS.items():
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[variant] = {'width': image.width, 'height': image.height}
+        for image_format in IMAGE_FORMATS:
+            variants[variant][image_format] = storage.save(
+                f'{VARIANTS_DIR}/{stem}_{variant}.{image_format}',
+                ContentFile(encode_image(image, image_format)),
+            )
+    image.thumbnail(
+        (IMAGE_PLACEHOLDER_SIZE, IMAGE_PLACEHOLDER_SIZE),
+        Image.Resampling.BOX,
+    )
+    return variants, blurhash.encode(image, *IMAGE_PLACEHOLDER_COMPONENTS)
+
+
+def variant_names(variants):
+    return [
+        variant[image_format]
+        for variant in variants.values()
+        for image_format in IMAGE_FORMATS
+        if image_format in variant
+    ]
+
+
+def process_image(recipe_id):
+    """Создаёт варианты изображения рецепта и заглушку BlurHash.
+
+    Результат сохраняется, только если изображение не заменили за время
+    обработки; иначе созданные файлы только регистрируются без ссылок,
+    их удалит gc_media. Возвращает True, если варианты сохранены.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return False
+    source = recipe.image.name
+    storage = recipe.image.storage
+    with storage.open(source, 'rb') as file:
+        image = open_image(file)
+    variants, placeholder = render_variants(
+        image, Path(source).stem, storage)
+    with transaction.atomic():
+        current = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=source,
+        ).values_list('image_variants', flat=True).first()
+        if current is None:
+            change_references(variant_names(variants), 0)
+            return False
+        Recipe.objects.filter(pk=recipe_id).update(
+            image_variants=variants,
+            image_placeholder=placeholder,
+        )
+        change_references(variant_names(variants), 1)
+        change_references(variant_names(current), -1)
+    return True
+
+
+def process_image_in_worker(recipe_id):
+    """process_image в процессе пула, который живёт дольше одного
+    соединения с базой."""
+    close_old_connections()
+    try:
+        return process_image(recipe_id)
+    finally:
+        close_old_connections()
+
+
+def create_executor(max_workers):
+    """Пул процессов spawn: дочерний процесс не наследует соединения
+    с базой и потоки веб-воркера, а настраивает Django заново."""
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def log_failure(future):
+    if future.exception() is not None:
+        logger.error(
+            'Не удалось обработать изображение рецепта',
+            exc_info=future.exception(),
+        )
+
+
+def get_executor():
+    """Пул создаётся при первой загрузке; под блокировкой, чтобы
+    параллельные потоки веб-воркера не создали по своему пулу."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = create_executor(settings.IMAGE_WORKERS)
+        return _executor
+
+
+def discard_executor(executor):
+    """Сбрасывает остановленный пул, если другой поток ещё не заменил
+    его новым."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+
+
+def submit(recipe_id):
+    """Ошибки только пишутся в лог: ответ на запрос уже готов, а
+    необработанные изображения подхватит команда process_images."""
+    executor = None
+    try:
+        if not settings.IMAGE_WORKERS:
+            process_image(recipe_id)
+            return
+        executor = get_executor()
+        executor.submit(process_image_in_worker, recipe_id).add_done_callback(
+            log_failure)
+    except BrokenProcessPool:
+        logger.exception('Пул обработки изображений остановлен')
+        discard_executor(executor)
+    except Exception:
+        logger.exception('Не удалось обработать изображение рецепта')
+
+
+def schedule_image_processing(recipe_id):
+    """Передаёт изображение в пул после фиксации транзакции."""
+    transaction.on_commit(lambda: submit(recipe_id))
+
+
+def image_uploaded(recipe, old_image=None):
+    """Учитывает загруженное изображение уже сохранённого рецепта.
+
+    old_image — имя прежнего файла. Повторная загрузка того же файла
+    в хранилище по содержимому даёт то же имя, и ничего не меняется.
+    Иначе ссылки переносятся на новый файл, варианты прежнего
+    сбрасываются, а новый ставится в очередь обработки. Варианты
+    читаются из базы: recipe мог быть загружен до того, как пул их
+    сохранил.
+    """
+    if recipe.image.name == old_image:
+        return
+    change_references([recipe.image.name], 1)
+    if old_image is not None:
+        variants = Recipe.objects.select_for_update().filter(
+            pk=recipe.pk).values_list('image_variants', flat=True).first()
+        change_references([old_image, *variant_names(variants or {})], -1)
+        recipe.image_variants = {}
+        recipe.image_placeholder = ''
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image_variants={}, image_placeholder='')
+    schedule_image_processing(recipe.pk)
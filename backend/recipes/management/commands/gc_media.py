@@ -0,0 +1,120 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from foodgram.constants import MEDIA_GC_BATCH_SIZE, MEDIA_GC_GRACE
+from recipes.images import VARIANTS_DIR
+from recipes.models import MediaBlob, Recipe
+
+
+def walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы изображений, на которые не ссылается ни один '
+        'рецепт, пачками по --batch-size. С --scan дополнительно ищет '
+        'в хранилище файлы без учёта ссылок (загруженные до учёта или '
+        'записанные в отменённой транзакции).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=MEDIA_GC_BATCH_SIZE)
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=MEDIA_GC_GRACE,
+            help='Не трогать файлы, изменённые за последние N секунд',
+        )
+        parser.add_argument('--scan', action='store_true')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def is_recent(self, name):
+        try:
+            return self.storage.get_modified_time(name) >= self.cutoff
+        except FileNotFoundError:
+            return False
+
+    def collect_orphans(self, batch_size, dry_run):
+        """Файлы с нулём ссылок. Файл, который недавно загрузили повторно
+        (хранилище обновляет время изменения), не удаляется, а его запись
+        откладывается на следующий запуск. Пачки блокируются с SKIP LOCKED
+        и не мешают параллельному запуску команды и загрузкам: хранилище
+        блокирует ту же запись, прежде чем обновить время файла. Условия
+        refcount=0 и updated перепроверяются под блокировкой, при
+        выборке и при удалении записей."""
+        orphans = MediaBlob.objects.filter(
+            refcount=0, updated__lt=self.cutoff).order_by('updated')
+        if dry_run:
+            return orphans.count()
+        removed = 0
+        while True:
+            with transaction.atomic():
+                blobs = list(
+                    orphans.select_for_update(skip_locked=True)[:batch_size])
+                if not blobs:
+                    return removed
+                deleted = []
+                for blob in blobs:
+                    if not self.is_recent(blob.name):
+                        self.storage.delete(blob.name)
+                        deleted.append(blob.pk)
+                orphans.filter(pk__in=deleted).delete()
+                MediaBlob.objects.filter(pk__in=[
+                    blob.pk for blob in blobs if blob.pk not in deleted
+                ]).update(updated=timezone.now())
+                removed += len(deleted)
+
+    def collect_untracked(self, batch_size, dry_run):
+        """Файлы в каталогах изображений без записи в MediaBlob."""
+        removed = 0
+        for directory in (self.image_field.upload_to, VARIANTS_DIR):
+            if not self.storage.exists(directory):
+                continue
+            for names in batches(walk(self.storage, directory), batch_size):
+                tracked = set(MediaBlob.objects.filter(
+                    name__in=names).values_list('name', flat=True))
+                tracked.update(Recipe.objects.filter(
+                    image__in=names).values_list('image', flat=True))
+                untracked = [
+                    name for name in names
+                    if name not in tracked and not self.is_recent(name)
+                ]
+                if not dry_run:
+                    for name in untracked:
+                        self.storage.delete(name)
+                removed += len(untracked)
+        return removed
+
+    def handle(self, *args, **options):
+        self.image_field = Recipe._meta.get_field('image')
+        self.storage = self.image_field.storage
+        self.cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        action = 'к удалению' if options['dry_run'] else 'удалено'
+        removed = self.collect_orphans(
+            options['batch_size'], options['dry_run'])
+        self.stdout.write(f'Файлов без ссылок {action}: {removed}')
+        if options['scan']:
+            removed = self.collect_untracked(
+                options['batch_size'], options['dry_run'])
+            self.stdout.write(f'Файлов без учёта {action}: {removed}')
@@ -1,21 +1,179 @@
 import csv
+import io
+import json
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from foodgram.cache import bump_version
+from foodgram.constants import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_READ_SIZE,
+    LENGTH_VALUE_FOR_RECIPE,
+)
 from recipes.models import Ingredient
 
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / 'data' / 'ingredients.csv'
+FORMATS = ('csv', 'json')
+INSERT_SQL = (
+    'INSERT INTO recipes_ingredient (name, measurement_unit) '
+    'SELECT * FROM unnest(%s::varchar[], %s::varchar[]) '
+    'ON CONFLICT (name, measurement_unit) DO NOTHING'
+)
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_json(stream, read_size=IMPORT_READ_SIZE):
+    """Потоковое чтение JSON-массива объектов или объектов подряд
+    (JSON Lines) без загрузки всего файла в память. Объект, который
+    не разбирается и после чтения 16 блоков, считается ошибкой."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    finished = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n[],':
+            position += 1
+        if position == len(buffer):
+            if finished:
+                return
+            buffer = stream.read(read_size)
+            position = 0
+            finished = not buffer
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = stream.read(read_size)
+            if not chunk or len(buffer) - position > read_size * 16:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+        position = end
+
 
 class Command(BaseCommand):
-    help = 'Импорт из файла'
+    help = 'Импорт ингредиентов из CSV или JSON (файл или stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=str(DEFAULT_PATH),
+            help='Путь к файлу или "-" для stdin, по умолчанию '
+                 'recipes/data/ingredients.csv',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат данных; по умолчанию определяется по расширению '
+                 'файла или по первому символу потока',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Сколько строк записывать одним INSERT',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Выполнить импорт в одной транзакции и откатить её; без '
+                 'этого флага каждая пачка сохраняется сразу',
+        )
+
+    def open(self, path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        try:
+            return open(path, encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть {path}: {error}')
+
+    def detect_format(self, path, stream):
+        suffix = Path(path).suffix.lstrip('.').lower()
+        if suffix in FORMATS:
+            return suffix
+        head = stream.buffer.peek(64).lstrip()
+        return 'json' if head[:1] in (b'[', b'{') else 'csv'
+
+    def clean(self, row, number):
+        if not isinstance(row, dict):
+            self.stderr.write(f'Запись {number}: ожидался объект')
+            return None
+        name = (row.get('name') or '').strip()
+        measurement_unit = (row.get('measurement_unit') or '').strip()
+        if not name or not measurement_unit:
+            self.stderr.write(
+                f'Запись {number}: нет name или measurement_unit')
+            return None
+        if max(len(name), len(measurement_unit)) > LENGTH_VALUE_FOR_RECIPE:
+            self.stderr.write(f'Запись {number}: слишком длинное значение')
+            return None
+        return name, measurement_unit
+
+    def write(self, batch):
+        """Пачка одним INSERT из двух массивов; уже существующие пары
+        (name, measurement_unit) пропускаются по unique_ingredient.
+        Возвращает число добавленных строк."""
+        names, measurement_units = zip(*batch)
+        with connection.cursor() as cursor:
+            cursor.execute(INSERT_SQL, (list(names), list(measurement_units)))
+            return cursor.rowcount
+
+    def run(self, rows, batch_size):
+        read = skipped = created = 0
+        batch = set()
+        started = time.perf_counter()
+        for read, row in enumerate(rows, 1):
+            key = self.clean(row, read)
+            if key is None:
+                skipped += 1
+                continue
+            batch.add(key)
+            if len(batch) >= batch_size:
+                created += self.write(batch)
+                batch = set()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'Прочитано {read}, {read / elapsed:.0f} строк/с')
+        if batch:
+            created += self.write(batch)
+        return read, skipped, created, time.perf_counter() - started
 
     def handle(self, *args, **options):
-        print('Поехали!')
-        with open(
-            'recipes/data/ingredients.csv', encoding='utf-8'
-        ) as data_csv:
-            for row in csv.DictReader(data_csv, delimiter=','):
-                try:
-                    Ingredient.objects.get_or_create(**row)
-                except Exception as error:
-                    print(f'Все фигня, давай по новой {error}')
-        print('Усё приехали.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        stream = self.open(options['path'])
+        with stream:
+            file_format = options['format'] or self.detect_format(
+                options['path'], stream)
+            rows = read_json(stream) if file_format == 'json' else (
+                read_csv(stream))
+            atomic = (
+                transaction.atomic() if options['dry_run'] else nullcontext())
+            try:
+                with atomic:
+                    read, skipped, created, elapsed = self.run(
+                        rows, options['batch_size'])
+                    if options['dry_run']:
+                        transaction.set_rollback(True)
+            except (csv.Error, json.JSONDecodeError, UnicodeError) as error:
+                raise CommandError(f'Ошибка чтения данных: {error}')
+        if created and not options['dry_run']:
+            bump_version(Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверено" if options["dry_run"] else "Импортировано"}: '
+            f'строк {read}, новых ингредиентов {created}, повторов '
+            f'{read - skipped - created}, пропущено {skipped}; '
+            f'{elapsed:.2f} с, {read / max(elapsed, 1e-9):.0f} строк/с'
+        ))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import (
+    create_executor,
+    process_image,
+    process_image_in_worker,
+)
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт варианты изображений и заглушки BlurHash для рецептов, '
+        'которые ещё не обработаны (например, после перезапуска воркера '
+        'или ошибки в пуле).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Обработать заново изображения всех рецептов',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Число процессов; 0 — обрабатывать в текущем процессе',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+        started = time.perf_counter()
+        if options['workers']:
+            with create_executor(options['workers']) as executor:
+                results = list(executor.map(
+                    process_image_in_worker, recipe_ids))
+        else:
+            results = [process_image(recipe_id) for recipe_id in recipe_ids]
+        self.stdout.write(
+            f'Обработано изображений: {sum(results)} из {len(recipe_ids)} '
+            f'за {time.perf_counter() - started:.1f} с')
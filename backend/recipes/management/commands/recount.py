@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики избранного, покупок, подписчиков и рецептов'
+
+    def handle(self, *args, **options):
+        for model, field, counted_model, link in COUNTERS:
+            with transaction.atomic():
+                fixed = recount(model, field, counted_model, link)
+            self.stdout.write(
+                f'{model._meta.label}.{field}: исправлено строк: {fixed}')
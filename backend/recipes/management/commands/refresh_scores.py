@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodgram.constants import SCORE_REFRESH_BATCH_SIZE
+from recipes.scores import refresh_scores
+
+
+class Command(BaseCommand):
+    help = 'Обновляет оценки рецептов для сортировок popular и trending'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать оценки всех рецептов',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SCORE_REFRESH_BATCH_SIZE,
+            help='Сколько рецептов пересчитывать одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        refreshed = refresh_scores(
+            full=options['full'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(
+            f'Пересчитано рецептов: {refreshed} '
+            f'за {time.perf_counter() - started:.2f} с'
+        )
@@ -0,0 +1,80 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import (
+    BigIntegerField,
+    IntegerField,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Value,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from foodgram.constants import MAX_MISSING_INGREDIENTS
+from recipes.models import IngredientInRecipe, Recipe
+
+MISSING_SQL = (
+    'cardinality({ids}) - '
+    '(SELECT COUNT(*) FROM unnest({ids}) AS id '
+    'WHERE id = ANY(%s::bigint[]))'
+)
+
+
+def ingredient_ids():
+    return Coalesce(
+        Subquery(
+            IngredientInRecipe.objects.filter(
+                recipe=OuterRef('pk'),
+            ).order_by().values('recipe').annotate(
+                ids=ArrayAgg('ingredient_id', ordering='ingredient_id'),
+            ).values('ids')
+        ),
+        Value([], output_field=ArrayField(BigIntegerField())),
+    )
+
+
+def update_ingredient_ids(recipes):
+    """Пересчитывает ingredient_ids одним UPDATE; recipes — queryset или
+    список id рецептов."""
+    if not isinstance(recipes, QuerySet):
+        recipes = Recipe.objects.filter(pk__in=recipes)
+    return recipes.update(ingredient_ids=ingredient_ids())
+
+
+def cookable(queryset, ingredients, missing=0):
+    """Рецепты, которые можно приготовить из ingredients.
+
+    Без missing — только рецепты, все ингредиенты которых есть в наборе
+    (ingredient_ids <@ набор). С missing — рецепты, которым не хватает
+    не больше missing ингредиентов; сначала идут рецепты с меньшим
+    числом недостающих.
+
+    Если не хватает не больше missing ингредиентов, то среди любых
+    missing + 1 ингредиентов рецепта хотя бы один есть в наборе. Поэтому
+    кандидаты выбираются по индексам на начало массива: при missing = 0
+    по первому id (B-tree recipe_first_ingredient_idx), иначе по первым
+    MAX_MISSING_INGREDIENTS + 1 id (GIN recipe_ingredient_ids_idx).
+    GIN-индекс по всему массиву для <@ не годится: популярные ингредиенты
+    есть почти в каждом наборе, и такой индекс отдаёт половину таблицы.
+    """
+    ingredients = sorted(set(ingredients))
+    if not missing:
+        return queryset.filter(
+            ingredient_ids__0__in=ingredients,
+            ingredient_ids__contained_by=ingredients,
+        ).annotate(missing_ingredients=Value(0, output_field=IntegerField()))
+    prefixes = {missing + 1, max(missing, MAX_MISSING_INGREDIENTS) + 1}
+    column = f'{Recipe._meta.db_table}.ingredient_ids'
+    return queryset.filter(**{
+        f'ingredient_ids__0_{prefix}__overlap': ingredients
+        for prefix in prefixes
+    }).annotate(
+        missing_ingredients=RawSQL(
+            MISSING_SQL.format(ids=column),
+            (ingredients, ),
+            output_field=IntegerField(),
+        ),
+    ).filter(
+        missing_ingredients__lte=missing,
+    ).order_by('missing_ingredients', '-pub_date', '-id')
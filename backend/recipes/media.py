@@ -0,0 +1,32 @@
+from django.apps import apps
+from django.db import connection
+
+CHANGE_REFERENCES_SQL = (
+    'WITH deltas AS (SELECT name, %s * COUNT(*) AS delta '
+    'FROM unnest(%s::text[]) AS name GROUP BY name) '
+    'INSERT INTO {table} (name, refcount, updated) '
+    'SELECT name, GREATEST(delta, 0), now() FROM deltas ORDER BY name '
+    'ON CONFLICT (name) DO UPDATE SET refcount = GREATEST('
+    '{table}.refcount + (SELECT delta FROM deltas '
+    'WHERE deltas.name = EXCLUDED.name), 0), updated = EXCLUDED.updated'
+)
+
+
+def change_references(names, delta):
+    """Сдвигает на delta число ссылок на каждый файл из names одним
+    запросом; повторы в names считаются отдельно. Файлы без записи
+    добавляются, delta=0 только регистрирует их. Строки блокируются
+    по порядку имён, чтобы параллельные запросы не взаимоблокировались.
+
+    MediaBlob берётся из реестра приложений: модуль импортирует
+    хранилище, которое импортируют модели."""
+    names = [name for name in names if name]
+    if not names:
+        return
+    table = apps.get_model('recipes', 'MediaBlob')._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            CHANGE_REFERENCES_SQL.format(
+                table=connection.ops.quote_name(table)),
+            (delta, names),
+        )
@@ -0,0 +1,40 @@
+from django.db import DatabaseError, migrations, transaction
+
+
+def create_trigram_index(apps, schema_editor):
+    """Индекс создается, только если на сервере доступен pg_trgm; без
+    него recipes.autocomplete ищет подстроку в памяти. Выражение индекса
+    совпадает с recipes.autocomplete.fold_expression."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            return
+        try:
+            with transaction.atomic():
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                cursor.execute(
+                    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+                    'ON recipes_ingredient USING gin '
+                    "(REPLACE(LOWER(name), 'ё', 'е') gin_trgm_ops)"
+                )
+        except DatabaseError:
+            pass
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_name_trgm'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def remove_duplicates(apps, schema_editor):
+    """Перед уникальными ограничениями оставляет первую из дублирующихся
+    связей рецепта с ингредиентом и с тегом."""
+    schema_editor.execute(
+        'DELETE FROM recipes_ingredientinrecipe AS duplicate '
+        'USING recipes_ingredientinrecipe AS original '
+        'WHERE duplicate.recipe_id = original.recipe_id '
+        'AND duplicate.ingredient_id = original.ingredient_id '
+        'AND duplicate.id > original.id'
+    )
+    schema_editor.execute(
+        'DELETE FROM recipes_tagforrecipe AS duplicate '
+        'USING recipes_tagforrecipe AS original '
+        'WHERE duplicate.recipe_id = original.recipe_id '
+        'AND duplicate.tag_id = original.tag_id '
+        'AND duplicate.id > original.id'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
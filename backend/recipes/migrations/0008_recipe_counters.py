@@ -0,0 +1,43 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счётчики по уже существующим данным."""
+    schema_editor.execute(
+        'UPDATE recipes_recipe AS recipe SET '
+        'favorites_count = (SELECT COUNT(*) FROM recipes_favorite '
+        'WHERE recipe_id = recipe.id), '
+        'shopping_carts_count = (SELECT COUNT(*) FROM recipes_shoppingcart '
+        'WHERE recipe_id = recipe.id)'
+    )
+    schema_editor.execute(
+        'UPDATE users_user AS author SET '
+        'followers_count = (SELECT COUNT(*) FROM users_follow '
+        'WHERE author_id = author.id), '
+        'recipes_count = (SELECT COUNT(*) FROM recipes_recipe '
+        'WHERE author_id = author.id)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_hot_query_indexes'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
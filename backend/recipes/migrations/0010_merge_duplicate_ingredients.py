@@ -0,0 +1,74 @@
+from django.db import migrations
+
+
+def merge_duplicates(apps, schema_editor):
+    """Сливает ингредиенты с одинаковыми названием и единицей измерения
+    в самый ранний: рецепты переводятся на него. Если в рецепте
+    оказывается несколько связей с ним, остаётся одна (связь с самим
+    ранним ингредиентом, иначе первая) с суммой количеств."""
+    schema_editor.execute(
+        'CREATE TEMPORARY TABLE ingredient_duplicates AS '
+        'SELECT duplicate.id AS duplicate_id, MIN(original.id) AS original_id '
+        'FROM recipes_ingredient AS duplicate '
+        'JOIN recipes_ingredient AS original '
+        'ON original.name = duplicate.name '
+        'AND original.measurement_unit = duplicate.measurement_unit '
+        'AND original.id < duplicate.id '
+        'GROUP BY duplicate.id'
+    )
+    schema_editor.execute(
+        'CREATE TEMPORARY TABLE merged_links AS '
+        'SELECT link.recipe_id, '
+        'COALESCE(map.original_id, link.ingredient_id) AS original_id, '
+        '(ARRAY_AGG(link.id ORDER BY map.duplicate_id IS NOT NULL, '
+        'link.id))[1] AS kept_id, '
+        'LEAST(SUM(link.amount), 32767) AS amount '
+        'FROM recipes_ingredientinrecipe AS link '
+        'LEFT JOIN ingredient_duplicates AS map '
+        'ON map.duplicate_id = link.ingredient_id '
+        'WHERE link.ingredient_id IN ('
+        'SELECT duplicate_id FROM ingredient_duplicates '
+        'UNION SELECT original_id FROM ingredient_duplicates) '
+        'GROUP BY link.recipe_id, '
+        'COALESCE(map.original_id, link.ingredient_id) '
+        'HAVING COUNT(*) > 1'
+    )
+    schema_editor.execute(
+        'UPDATE recipes_ingredientinrecipe AS link '
+        'SET amount = merged.amount '
+        'FROM merged_links AS merged '
+        'WHERE link.id = merged.kept_id'
+    )
+    schema_editor.execute(
+        'DELETE FROM recipes_ingredientinrecipe AS link '
+        'USING merged_links AS merged '
+        'WHERE link.recipe_id = merged.recipe_id '
+        'AND link.id <> merged.kept_id '
+        'AND (link.ingredient_id = merged.original_id '
+        'OR link.ingredient_id IN (SELECT duplicate_id '
+        'FROM ingredient_duplicates '
+        'WHERE original_id = merged.original_id))'
+    )
+    schema_editor.execute(
+        'UPDATE recipes_ingredientinrecipe AS link '
+        'SET ingredient_id = map.original_id '
+        'FROM ingredient_duplicates AS map '
+        'WHERE link.ingredient_id = map.duplicate_id'
+    )
+    schema_editor.execute(
+        'DELETE FROM recipes_ingredient '
+        'WHERE id IN (SELECT duplicate_id FROM ingredient_duplicates)'
+    )
+    schema_editor.execute('DROP TABLE merged_links')
+    schema_editor.execute('DROP TABLE ingredient_duplicates')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:28
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+def fill_ingredient_ids(apps, schema_editor):
+    schema_editor.execute(
+        "UPDATE recipes_recipe AS recipe SET ingredient_ids = COALESCE(("
+        "SELECT array_agg(link.ingredient_id ORDER BY link.ingredient_id) "
+        "FROM recipes_ingredientinrecipe AS link "
+        "WHERE link.recipe_id = recipe.id), '{}')"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, editable=False, size=None, verbose_name='id ингредиентов'),
+        ),
+        migrations.RunPython(fill_ingredient_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(django.db.models.expressions.F('ingredient_ids__0'), name='recipe_first_ingredient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(django.db.models.expressions.F('ingredient_ids__0_6'), name='recipe_ingredient_ids_idx'),
+        ),
+    ]
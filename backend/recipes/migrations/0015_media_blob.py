@@ -0,0 +1,51 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:48
+
+from django.db import migrations, models
+import recipes.storage
+
+
+def register_media(apps, schema_editor):
+    schema_editor.execute(
+        "INSERT INTO recipes_mediablob (name, refcount, updated) "
+        "SELECT name, COUNT(*), now() FROM ("
+        "SELECT image AS name FROM recipes_recipe WHERE image <> '' "
+        "UNION ALL "
+        "SELECT variant.value ->> format "
+        "FROM recipes_recipe, jsonb_each(image_variants) AS variant, "
+        "unnest(ARRAY['webp', 'jpeg']) AS format "
+        "WHERE variant.value ? format"
+        ") AS refs GROUP BY name"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('refcount', models.IntegerField(default=0, verbose_name='Число ссылок')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Файл изображения',
+                'verbose_name_plural': 'Файлы изображений',
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/media', verbose_name='Изображение'),
+        ),
+        migrations.RunPython(register_media, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='mediablob',
+            index=models.Index(condition=models.Q(('refcount', 0)), fields=['updated'], name='media_blob_orphan_idx'),
+        ),
+    ]
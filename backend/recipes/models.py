@@ -1,3 +1,6 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (
     MaxValueValidator,
     MinValueValidator,
@@ -6,11 +9,16 @@ from django.core.validators import (
 from django.db import models
 
 from foodgram.constants import (
+    IMAGE_PLACEHOLDER_LENGTH,
     LENGTH_VALUE_FOR_COLOR,
     LENGTH_VALUE_FOR_RECIPE,
+    MAX_MISSING_INGREDIENTS,
     MAX_VALUE_FOR_RECIPE,
+    MEDIA_NAME_LENGTH,
     MIN_VALUE_FOR_RECIPE,
 )
+from foodgram.mixins import PreservedFieldsMixin
+from recipes.storage import ContentAddressedStorage
 from users.models import User
 
 
@@ -63,9 +71,25 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=(
+                    'name',
+                    'measurement_unit'
+                ),
+                name='unique_ingredient'
+            )
+        ]
 
 
-class Recipe(models.Model):
+class Recipe(PreservedFieldsMixin, models.Model):
+    preserved_fields = (
+        'favorites_count',
+        'shopping_carts_count',
+        'image_variants',
+        'image_placeholder',
+    )
+
     ingredients = models.ManyToManyField(
         Ingredient,
         through='IngredientInRecipe',
@@ -101,21 +125,77 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/media',
+        storage=ContentAddressedStorage(),
         blank=False,
         verbose_name='Изображение',
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты изображения',
+    )
+    image_placeholder = models.CharField(
+        max_length=IMAGE_PLACEHOLDER_LENGTH,
+        blank=True,
+        editable=False,
+        verbose_name='Заглушка изображения (BlurHash)',
+    )
     pub_date = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    ingredient_ids = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        editable=False,
+        verbose_name='id ингредиентов',
+    )
 
     def __str__(self):
         return self.name
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('pub_date', 'id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', 'pub_date', 'id'),
+                name='recipe_author_pub_date_idx',
+            ),
+            GinIndex(
+                fields=('search_vector', ),
+                name='recipe_search_vector_idx',
+            ),
+            models.Index(
+                models.F('ingredient_ids__0'),
+                name='recipe_first_ingredient_idx',
+            ),
+            GinIndex(
+                models.F(f'ingredient_ids__0_{MAX_MISSING_INGREDIENTS + 1}'),
+                name='recipe_ingredient_ids_idx',
+            ),
+        ]
 
 
 class IngredientInRecipe(models.Model):
@@ -143,6 +223,15 @@ class IngredientInRecipe(models.Model):
         ordering = ['id']
         verbose_name = 'Ингридиент в рецептe'
         verbose_name_plural = 'Ингридиенты в рецептe'
+        constraints = [
+            models.UniqueConstraint(
+                fields=(
+                    'recipe',
+                    'ingredient'
+                ),
+                name='unique_ingredient_recipe'
+            )
+        ]
 
 
 class TagForRecipe(models.Model):
@@ -164,6 +253,15 @@ class TagForRecipe(models.Model):
         ordering = ['id']
         verbose_name = 'Тег рецепта'
         verbose_name_plural = 'Теги рецепта'
+        constraints = [
+            models.UniqueConstraint(
+                fields=(
+                    'tag',
+                    'recipe'
+                ),
+                name='unique_tag_recipe'
+            )
+        ]
 
 
 class Favorite(models.Model):
@@ -179,6 +277,11 @@ class Favorite(models.Model):
         related_name='favorite_recipe',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     def __str__(self):
         return self.recipe.name
@@ -210,6 +313,11 @@ class ShoppingCart(models.Model):
         related_name='shopping',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     def __str__(self):
         return self.recipe.name
@@ -227,3 +335,90 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+
+
+class RecipeScore(models.Model):
+    """Предрасчитанные оценки для сортировок popular и trending.
+
+    popular — сколько раз рецепт добавлен в избранное и в списки покупок.
+    trending — те же добавления с экспоненциальным затуханием, хранится
+    в логарифмической шкале: ln(sum(2 ** (t / TRENDING_HALF_LIFE))), где t —
+    время добавления в секундах. Порядок по такой величине совпадает
+    с порядком по затухшей на любой момент сумме, поэтому со временем
+    строки не пересчитываются, а обновляются только для рецептов
+    с новыми или удаленными добавлениями (команда refresh_scores).
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт',
+    )
+    popular = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Популярность',
+    )
+    trending = models.FloatField(
+        default=float('-inf'),
+        verbose_name='Актуальность',
+    )
+    updated = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Дата пересчета',
+    )
+
+    def __str__(self):
+        return self.recipe.name
+
+    class Meta:
+        verbose_name = 'Оценка рецепта'
+        verbose_name_plural = 'Оценки рецептов'
+        indexes = [
+            models.Index(
+                fields=('-popular', '-recipe'),
+                name='recipe_score_popular_idx',
+            ),
+            models.Index(
+                fields=('-trending', '-recipe'),
+                name='recipe_score_trending_idx',
+            ),
+        ]
+
+
+class MediaBlob(models.Model):
+    """Файл изображения в хранилище и число ссылок на него.
+
+    Ссылаются на файл исходные изображения рецептов и их варианты;
+    файлы без ссылок удаляет команда gc_media.
+    """
+
+    name = models.CharField(
+        max_length=MEDIA_NAME_LENGTH,
+        unique=True,
+        verbose_name='Файл',
+    )
+    refcount = models.IntegerField(
+        default=0,
+        verbose_name='Число ссылок',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+        indexes = [
+            models.Index(
+                fields=('updated', ),
+                condition=models.Q(refcount=0),
+                name='media_blob_orphan_idx',
+            ),
+        ]
@@ -0,0 +1,105 @@
+import math
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import F, Max
+from django.utils import timezone
+
+from foodgram.constants import (
+    SCORE_REFRESH_BATCH_SIZE,
+    SCORE_REFRESH_OVERLAP,
+    TRENDING_HALF_LIFE,
+)
+from recipes.models import Favorite, Recipe, RecipeScore, ShoppingCart
+
+# Вклад добавления в trending: 2 ** (t / TRENDING_HALF_LIFE) = e ** (t * k)
+TRENDING_RATE = math.log(2) / TRENDING_HALF_LIFE
+
+# Логарифм суммы считается как m + ln(sum(e ** (x - m))), m — максимум
+# по рецепту; показатель ограничен снизу, чтобы EXP не давал underflow.
+REFRESH_SQL = '''
+INSERT INTO recipes_recipescore (recipe_id, popular, trending, updated)
+SELECT
+    recipe.id,
+    COUNT(event.x),
+    COALESCE(
+        MAX(event.m) + LN(SUM(EXP(GREATEST(event.x - event.m, -700)))),
+        '-Infinity'
+    ),
+    %(now)s
+FROM recipes_recipe AS recipe
+LEFT JOIN (
+    SELECT recipe_id, x, MAX(x) OVER (PARTITION BY recipe_id) AS m
+    FROM (
+        SELECT recipe_id, EXTRACT(EPOCH FROM created)::float8 * %(rate)s AS x
+        FROM recipes_favorite WHERE recipe_id = ANY(%(ids)s)
+        UNION ALL
+        SELECT recipe_id, EXTRACT(EPOCH FROM created)::float8 * %(rate)s
+        FROM recipes_shoppingcart WHERE recipe_id = ANY(%(ids)s)
+    ) AS events
+) AS event ON event.recipe_id = recipe.id
+WHERE recipe.id = ANY(%(ids)s)
+GROUP BY recipe.id
+ON CONFLICT (recipe_id) DO UPDATE SET
+    popular = EXCLUDED.popular,
+    trending = EXCLUDED.trending,
+    updated = EXCLUDED.updated
+'''
+
+
+def refresh_recipes(recipe_ids, now):
+    """Пересчитывает оценки указанных рецептов по их добавлениям."""
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_SQL, {
+            'ids': list(recipe_ids),
+            'rate': TRENDING_RATE,
+            'now': now,
+        })
+        return cursor.rowcount
+
+
+def get_stale_recipe_ids(since):
+    """Рецепты, оценки которых могли измениться с момента since.
+
+    Кроме новых добавлений учитываются рецепты без строки оценок и
+    рецепты, у которых счетчики добавлений разошлись с popular: так
+    находятся удаления из избранного и списков покупок.
+    """
+    recipe_ids = set(Favorite.objects.filter(
+        created__gte=since).values_list('recipe_id', flat=True))
+    recipe_ids.update(ShoppingCart.objects.filter(
+        created__gte=since).values_list('recipe_id', flat=True))
+    recipe_ids.update(Recipe.objects.filter(
+        score__isnull=True).values_list('id', flat=True))
+    recipe_ids.update(RecipeScore.objects.exclude(
+        popular=F('recipe__favorites_count')
+        + F('recipe__shopping_carts_count'),
+    ).values_list('recipe_id', flat=True))
+    return recipe_ids
+
+
+def refresh_scores(full=False, batch_size=SCORE_REFRESH_BATCH_SIZE):
+    """Обновляет таблицу оценок и возвращает число пересчитанных рецептов.
+
+    Без full пересчитываются только рецепты с изменениями после
+    предыдущего запуска (с запасом SCORE_REFRESH_OVERLAP секунд на
+    транзакции, завершившиеся позже).
+    """
+    now = timezone.now()
+    since = RecipeScore.objects.aggregate(Max('updated'))['updated__max']
+    if full or since is None:
+        recipe_ids = Recipe.objects.order_by('id').values_list(
+            'id', flat=True).iterator(chunk_size=batch_size)
+    else:
+        recipe_ids = sorted(get_stale_recipe_ids(
+            since - timedelta(seconds=SCORE_REFRESH_OVERLAP)))
+    refreshed = 0
+    batch = []
+    for recipe_id in recipe_ids:
+        batch.append(recipe_id)
+        if len(batch) >= batch_size:
+            refreshed += refresh_recipes(batch, now)
+            batch = []
+    if batch:
+        refreshed += refresh_recipes(batch, now)
+    return refreshed
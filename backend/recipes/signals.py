@@ -0,0 +1,117 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram.cache import bump_version_on_commit
+from recipes.cache import invalidate_recipes
+from recipes.counters import change_counted
+from recipes.images import variant_names
+from recipes.matching import update_ingredient_ids
+from recipes.media import change_references
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeScore,
+    ShoppingCart,
+    Tag,
+    TagForRecipe,
+)
+from recipes.search import update_search_vectors
+from users.models import Follow, User
+
+# Поля автора в представлении рецепта, кроме is_subscribed
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    bump_version_on_commit(Ingredient)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes(instance, created, **kwargs):
+    """Новое название ингредиента попадает в поиск по рецептам с ним."""
+    if not created:
+        update_search_vectors(
+            Recipe.objects.filter(recipe_ingredient__ingredient=instance))
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_deleted_ingredient(instance, **kwargs):
+    """Удалённый ингредиент убирается из ingredient_ids и поиска."""
+    recipes = list(Recipe.objects.filter(
+        ingredient_ids__contains=[instance.pk]).values_list('pk', flat=True))
+    update_ingredient_ids(recipes)
+    update_search_vectors(recipes)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_version_on_commit(Tag)
+
+
+@receiver(post_save, sender=Recipe)
+def create_score(instance, created, **kwargs):
+    """Новый рецепт сразу попадает в сортировки popular и trending."""
+    if created:
+        RecipeScore.objects.create(recipe=instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def count_created(instance, created, raw, **kwargs):
+    """Фикстуры (raw) загружаются вместе с уже посчитанными счётчиками."""
+    if created and not raw:
+        change_counted(instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def count_deleted(instance, **kwargs):
+    change_counted(instance, -1)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_media(instance, **kwargs):
+    """Файлы удалённого рецепта остаются без ссылки и удаляются
+    командой gc_media."""
+    change_references(
+        [instance.image.name, *variant_names(instance.image_variants)], -1)
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+@receiver((post_save, post_delete), sender=TagForRecipe)
+def invalidate_recipe_link(instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=TagForRecipe)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    """recipe.tags.set() и tag.recipes.add() не вызывают post_save."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_recipes([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_recipes(instance.recipes.values_list('pk', flat=True))
+    else:
+        invalidate_recipes(pk_set)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields, **kwargs):
+    """Изменения автора попадают в представления его рецептов; вход
+    пользователя (update_fields=['last_login']) их не затрагивает."""
+    if created or (update_fields and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    invalidate_recipes(instance.recipes.values_list('pk', flat=True))
@@ -0,0 +1,51 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+from recipes.media import change_references
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются по sha256 содержимого.
+
+    Одинаковый файл записывается один раз: если он уже есть, запись
+    пропускается, а время изменения файла обновляется, чтобы gc_media
+    не удалил файл, на который только что сослались. Каталог из upload_to
+    сохраняется, внутри файлы раскладываются по первым двум символам хеша.
+
+    Перед проверкой файла блокируется его запись в MediaBlob, которую
+    gc_media держит, пока удаляет файл. Либо gc_media уже удалил файл и
+    запись, и файл пишется заново, либо он увидит обновлённое время
+    записи и пропустит её. Внутри транзакции запроса блокировка
+    держится до её конца, то есть и до учёта ссылки на файл.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        return posixpath.join(
+            posixpath.dirname(name),
+            digest[:2],
+            digest + posixpath.splitext(name)[1].lower(),
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        with transaction.atomic():
+            change_references([name], 0)
+            if self.exists(name):
+                os.utime(self.path(name))
+                return name
+            return self._save(name, content)
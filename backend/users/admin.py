@@ -12,6 +12,8 @@ class UserAdmin(admin.UserAdmin):
         'username',
         'first_name',
         'last_name',
+        'followers_count',
+        'recipes_count',
     )
     list_filter = (
         'email',
@@ -8,12 +8,14 @@ from foodgram.constants import (
     LENGTH_VALUE_FOR_USER,
     MIN_VALUE,
 )
+from foodgram.mixins import PreservedFieldsMixin
 from users.validators import validate_username
 
 
-class User(AbstractUser):
+class User(PreservedFieldsMixin, AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
+    preserved_fields = ('followers_count', 'recipes_count')
 
     username = models.CharField(
         blank=False,
@@ -47,6 +49,16 @@ class User(AbstractUser):
         max_length=LENGTH_VALUE_FOR_USER,
         verbose_name='Пароль',
     )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
 
     def __str__(self):
         return self.username